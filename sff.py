@@ -27,24 +27,31 @@ AUTHORS:
 #                  http://www.gnu.org/licenses/
 #***************************************************************************************
 
+from weakref import WeakValueDictionary, ref as weak_ref
+from contextlib import contextmanager
+from collections import OrderedDict
 from sage.structure.sage_object import SageObject
+from sage.structure.sequence import Sequence
 from sage.misc.cachefunc import cached_function
 from sage.misc.latex import latex
-from sage.misc.functional import symbolic_prod as product
+from sage.misc.randstate import seed as randstate_seed
+from sage.misc.misc_c import prod
 from sage.matrix.constructor import matrix
+from sage.matrix.special import random_matrix, identity_matrix
+from sage.modules.free_module_element import vector
 from sage.rings.integer import Integer
 from sage.rings.integer_ring import ZZ
 from sage.rings.rational_field import QQ
 from sage.rings.finite_rings.finite_field_constructor import GF
-from sage.rings.rational_field import RationalField
-from sage.calculus.functions import jacobian
 from sage.features.interfaces import Macaulay2
 from sage.interfaces.macaulay2 import macaulay2, sage
 from sage.categories.fields import Fields
 from sage.categories.homset import Hom
 from sage.rings.infinity import Infinity
 from sage.rings.polynomial.polynomial_ring_constructor import PolynomialRing
+from sage.rings.polynomial.term_order import TermOrder
 from sage.rings.polynomial.multi_polynomial_ideal import MPolynomialIdeal
+from sage.rings.polynomial.multi_polynomial_ring_base import MPolynomialRing_base
 from sage.schemes.projective.projective_space import ProjectiveSpace
 from sage.schemes.projective.projective_subscheme import AlgebraicScheme_subscheme_projective
 from sage.schemes.projective.projective_morphism import SchemeMorphism_polynomial_projective_space, SchemeMorphism_polynomial_projective_space_field
@@ -52,7 +59,20 @@ from sage.schemes.generic.morphism import SchemeMorphism
 from sage.rings.ideal import Ideal as ideal
 from sage.functions.other import binomial
 from sage.libs.singular.function_factory import singular_function
+from sage.libs.singular.option import opt_ctx
 _minbase = singular_function('minbase')
+_reduce = singular_function('reduce')
+
+def _minbase_with_degree_bound(I, d):
+    r"""Return a minimal set of generators of the homogeneous ideal ``I``, assuming that ``I`` is generated in degree at most ``d``.
+
+    Over the rationals, :func:`_minbase_modular` is used and the degree bound is not needed.
+    Over other fields, the degree bound ``d`` is passed to ``Singular``; since no minimal generator can have degree larger than ``d``, the result is the same as ``_minbase(I)``.
+    """
+    if I.base_ring() is QQ:
+        return _minbase_modular(I)
+    with opt_ctx(deg_bound=d):
+        return _minbase(I)
 
 __VERBOSE__ = False
 def verbosity(b):
@@ -70,6 +90,45 @@ def verbosity(b):
     global __VERBOSE__
     __VERBOSE__ = b
 
+__VALIDATE__ = __debug__
+def validation(b):
+    r"""Enable or disable the consistency checks performed by some functions of this module.
+
+    These checks (e.g., that a computed map is really an isomorphism, or that a computed subvariety
+    is contained in the expected variety) require Groebner basis computations. Since they detect wrong answers
+    of probabilistic algorithms, they are enabled by default (unless Python runs with the ``-O`` option).
+    Use ``validation(False)`` to disable them.
+
+    INPUT:
+
+    :class:`bool`
+
+    """
+    if not isinstance(b,bool):
+        raise TypeError("expected True or False")
+    global __VALIDATE__
+    __VALIDATE__ = b
+
+__PRESUME_VERIFIED__ = False
+@contextmanager
+def presume_verified():
+    r"""Context manager inside which Hodge-special fourfolds are constructed without any verification.
+
+    Inside a ``with presume_verified():`` block, the constructor of :class:`Hodge_special_fourfold`
+    does not check that the surface is contained in the fourfold, that the fourfold is contained in the fivefold,
+    and that the fourfold and the fivefold are smooth, as if ``check=False`` had been passed and the containments were known.
+    This saves several Groebner basis computations per fourfold, but wrong input is then silently accepted:
+    use it only with fourfolds known to be valid, e.g. when reconstructing fourfolds in a loop.
+
+    """
+    global __PRESUME_VERIFIED__
+    old = __PRESUME_VERIFIED__
+    __PRESUME_VERIFIED__ = True
+    try:
+        yield
+    finally:
+        __PRESUME_VERIFIED__ = old
+
 class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
     r"""The class of closed subvarieties of projective spaces.
 
@@ -141,7 +200,7 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         13
         sage: X.ambient()
         PP^4
-        sage: p = X.point(); p
+        sage: p = X.point(); p     # random
         one-point scheme in PP^4 of coordinates [1, 52775, 1712, 653, 60565]
         sage: p.dimension() == 0 and p.degree() == 1 and p.is_subset(X)
         True
@@ -174,7 +233,13 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             super().__init__(PP, [])
         else:
             super().__init__(PP.ambient_space(),PP.defining_polynomials())
+        self._ambient_ring = self.ambient_space().coordinate_ring()
+        self._ambient_ring_gens = self._ambient_ring.gens()
         self._homogeneous_components_ideal = {}
+        self._subset_tests = OrderedDict()
+        self._hyperplane_sections = {}
+        self._intersections = OrderedDict()
+        self._degrees_generators = tuple([g.degree() for g in self.defining_polynomials()])
 
     def _repr_(self):
         r"""Return a string representation of the variety
@@ -225,7 +290,10 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         try:
             return self._dimension
         except AttributeError:
-            self._dimension = max(super().dimension(),-1)
+            if all(i == 1 for i in self.degrees_generators()):
+                self._dimension = len(self._ambient_ring_gens) - 1 - _linear_coefficient_matrix(self.defining_polynomials(), self._ambient_ring).rank()
+            else:
+                self._dimension = max(super().dimension(),-1)
             return self._dimension
 
     def codimension(self):
@@ -316,6 +384,8 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             C = [Embedded_projective_variety(Y) for Y in super().irreducible_components()]
             if len(C) == 1 and C[0] == self:
                 C = [self]
+            for Y in C:
+                Y._list_of_irreducible_components = [Y]
             self._list_of_irreducible_components = C
             return self._list_of_irreducible_components
 
@@ -361,10 +431,8 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             if not self.dimension() >= 1:
                 raise ValueError("expected a positive dimensional scheme")
             P = self.hilbert_polynomial()
-            t = PolynomialRing(RationalField(), 1, 't').gen()
-            for i in range(self.dimension() - 1):
-                P = P(t)-P(t-1)
-            self._sectional_genus = Integer(1-P(0))
+            r = self.dimension() - 1
+            self._sectional_genus = Integer(1 - sum([(-1)**i * binomial(r,i) * P(-i) for i in range(r+1)]))
             return self._sectional_genus
 
     def topological_euler_characteristic(self, verbose=None, algorithm=None):
@@ -398,7 +466,7 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
                 raise TypeError("expected True or False")
             if algorithm not in (None, 'macaulay2', 'sage'):
                 raise ValueError("keyword algorithm must be 'macaulay2' or 'sage'")
-            if algorithm == 'macaulay2' or (algorithm is None and min(self.degrees_generators()) != max(self.degrees_generators()) and Macaulay2().is_present()):
+            if algorithm == 'macaulay2' or (algorithm is None and len(set(self.degrees_generators())) > 1 and Macaulay2().is_present()):
                 if verbose:
                     print("--topological_euler_characteristic(): transferring computation to Macaulay2...")
                 return self._topological_Euler_characteristic_macaulay2(verbose=verbose)
@@ -407,10 +475,12 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             d = f.projective_degrees()
             r = self.dimension()
             n = self.ambient().dimension()
-            h = PolynomialRing(ZZ,'h',1).gens()[0]
-            Segre_Class = sum([(-1)**(n-k-1) * sum([(-1)**i*binomial(n-k,i)*m**(n-k-i)*d[i] for i in range(n-k+1)]) * h**(n-k) for k in range(r+1)])
-            Chern_Fulton_Class = Segre_Class * (1+h)**(n+1)
-            self._topological_euler_characteristic = Integer(Chern_Fulton_Class.list()[n])
+            s = [0 for j in range(n+1)]
+            for k in range(r+1):
+                s[n-k] = (-1)**(n-k-1) * sum(((-1)**i*binomial(n-k,i)*m**(n-k-i)*d[i] for i in range(n-k+1)), ZZ.zero())
+            # degree n part of Segre_Class * (1+h)^(n+1), where Segre_Class = sum(s[j]*h^j)
+            Chern_Fulton_Class_n = sum((s[j] * binomial(n+1,n-j) for j in range(n+1)), ZZ.zero())
+            self._topological_euler_characteristic = Integer(Chern_Fulton_Class_n)
             return self._topological_euler_characteristic
 
     def _topological_Euler_characteristic_macaulay2(self, verbose=None):
@@ -437,22 +507,18 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         if self.codimension() == 0:
             self.empty().random(*[1 for i in range(self.dimension())])
         if self.codimension() > 1:
-            h = rational_map(self,[_random1(self.ambient().coordinate_ring()) for i in range(self.dimension()+2)])
+            h = rational_map(self,_random_linear_forms(self._ambient_ring, self.dimension()+2))
             Y = h.image()
             p = h.inverse_image(Y._raw_point())
             assert(p._is_point())
             return p
-        for i in range(10):
-            X = self.hyperplane_section(cache=False)
-            j = X.embedding_as_hyperplane_section()
-            L = [q for q in X.irreducible_components() if q._is_point()]
-            if len(L) == 0:
-                continue
-            p = j(L[0])
-            assert(p._is_point())
-            return p
-        else:
-            raise RuntimeError("function _raw_point() failed: reached maximum number of 10 attempts to find rational point")
+        R = self._ambient_ring
+        for k in (1, 3, 6):
+            H = Embedded_projective_variety(self.ambient_space(), [prod(_random_linear_forms(R, k))])
+            L = [q for q in self.intersection(H).irreducible_components() if q._is_point()]
+            if len(L) > 0:
+                return L[0]
+        raise RuntimeError("function _raw_point() failed: reached maximum number of 10 attempts to find rational point")
 
     def point(self, verbose=None, algorithm='sage'):
         r"""Pick a random point on the variety defined over a finite field.
@@ -488,10 +554,10 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         X = macaulay2(self)
         pointOnX = X.point()
         c = pointOnX.coordinates().sage()
-        v = list(self.ambient_space().coordinate_ring().gens())
+        v = list(self._ambient_ring_gens)
         M = matrix([v, c])
         polys = _minbase(ideal(M.minors(2)))
-        assert((ideal(polys)).ring() is self.ambient().coordinate_ring())
+        assert((ideal(polys)).ring() is self._ambient_ring)
         p = Embedded_projective_variety(self.ambient_space(),polys)
         p._coordinate_list = c
         assert(p._is_point() and p.is_subset(self))
@@ -505,10 +571,8 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         try:
             return self.__is_Point
         except AttributeError:
-            if not all(i == 1 for i in self.degrees_generators()):
-                self.__is_Point = False
-                return self.__is_Point
-            self.__is_Point = self.dimension() == 0 and self.codimension() == self.ambient().dimension()
+            degs = self.degrees_generators()
+            self.__is_Point = len(degs) >= self.ambient_space().dimension() and all(i == 1 for i in degs) and self.dimension() == 0
             return self.__is_Point
 
     def _coordinates(self):
@@ -519,10 +583,11 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             if not self._is_point():
                 raise ValueError("expected a point")
             I = self.defining_ideal()
-            M = jacobian(I.gens(),I.ring().gens()).change_ring(I.ring().base_ring())
-            assert((M * matrix([I.ring().gens()]).transpose()).list() == I.gens())
-            c = M.right_kernel_matrix().list()
-            assert(len(c) == self.ambient().dimension() + 1)
+            M = _linear_coefficient_matrix(I.gens(), I.ring())
+            K = M.right_kernel_matrix()
+            # a point is the kernel of the coefficient matrix of its linear forms, which is one-dimensional
+            assert(K.nrows() == 1)
+            c = K.row(0).list()
             self._coordinate_list = c
             return self._coordinate_list
 
@@ -641,7 +706,8 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         try:
             return self._singular_locus
         except AttributeError:
-            self._singular_locus = Embedded_projective_variety(self.ambient_space(), _minbase(self.Jacobian()))
+            J = self.Jacobian()
+            self._singular_locus = Embedded_projective_variety(self.ambient_space(), _minbase_with_degree_bound(J, max(g.degree() for g in J.gens())))
             return self._singular_locus
 
     def to_built_in_variety(self):
@@ -715,18 +781,29 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             raise TypeError("expected an integer")
         if not isinstance(trim,bool):
             raise TypeError("expected True or False")
-        I = self.defining_ideal()
-        R = I.ring()
+        R = self._ambient_ring
         B = []
-        for g in I.gens():
+        for g in self._minimal_generators():
             if g.degree() <= n:
                 B = B + (g * ideal(R.gens()) ** (n-g.degree())).gens()
-        if len(B) > 0 and trim:
-            B = _minbase(ideal(B))
+        if len(B) > binomial(R.ngens()-1+n, n) and trim:
+            # more forms than monomials of degree n: B is very redundant, so row-reduce it first
+            B = list(ideal(B).interreduced_basis())
+        elif len(B) > 0 and trim:
+            B = _minbase_with_degree_bound(ideal(B), n)
         if trim:
             self._homogeneous_components_ideal.update({n:B})
         return(B)
 
+    def _minimal_generators(self):
+        r"""Return a minimal set of generators for the defining ideal of the variety (for internal use only)."""
+        try:
+            return self._list_of_minimal_generators
+        except AttributeError:
+            I = self.defining_ideal()
+            self._list_of_minimal_generators = I.gens() if len(I.gens()) <= 1 else _minbase_with_degree_bound(I, max(g.degree() for g in I.gens()))
+            return self._list_of_minimal_generators
+
     def linear_span(self):
         r"""Return the linear span of the variety.
 
@@ -741,12 +818,19 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             linear 3-dimensional subspace of PP^5
             sage: X.is_subset(_)
             True
+            sage: X.linear_span() is X.linear_span()
+            True
 
         """
-        L = self._homogeneous_component(1, trim=True)
-        if len(L) == 0:
-            return self.ambient()
-        return Embedded_projective_variety(self.ambient_space(),L)
+        try:
+            return self._linear_span
+        except AttributeError:
+            L = self._homogeneous_component(1, trim=True)
+            if len(L) == 0:
+                self._linear_span = self.ambient()
+            else:
+                self._linear_span = Embedded_projective_variety(self.ambient_space(),L)
+            return self._linear_span
 
     def random(self, *args):
         r"""Return a random complete intersection containing the variety.
@@ -783,7 +867,9 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         L = []
         for i in set(args):
             B = self._homogeneous_component(i, trim=False)
-            L.extend([sum([K.random_element() * g for g in B]) for i in range(args.count(i))])
+            m = args.count(i)
+            C = matrix(K, m, len(B), [K.random_element() for k in range(m*len(B))])
+            L.extend((C * vector(self._ambient_ring, B)).list())
         X = Embedded_projective_variety(self.ambient_space(),L)
         if X.codimension() != len(args):
             raise ValueError("unable to construct complete intersection containing the variety, maybe too many degrees are given")
@@ -798,9 +884,16 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             sage: X = PP(3)
             sage: X.empty()
             empty subscheme of PP^3
+            sage: X.empty() is Veronese(1,3).empty()
+            True
 
         """
-        return(Embedded_projective_variety(self.ambient_space(),[self.ambient_space().coordinate_ring().one()]))
+        P = self.ambient_space()
+        E = _empty_subschemes.get(P)
+        if E is None:
+            E = Embedded_projective_variety(P,[P.coordinate_ring().one()])
+            _empty_subschemes[P] = E
+        return E
 
     def random_coordinate_change(self):
         r"""Apply a random coordinate change on the ambient projective space of ``self``.
@@ -813,7 +906,7 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             sage: C.defining_ideal()
             Ideal (x2^2 - x1*x3, x1*x2 - x0*x3, x1^2 - x0*x2) of Multivariate Polynomial Ring in x0, x1, x2, x3 over Finite Field of size 13
             sage: D = C.random_coordinate_change()
-            sage: D.defining_ideal()
+            sage: D.defining_ideal()     # random
             Ideal (2*x0^2 + 5*x0*x1 - 4*x1^2 - 2*x0*x2 - x1*x2 + 3*x2^2 - 2*x0*x3 + x1*x3 + 2*x2*x3 + 6*x3^2, 6*x0^2 + x0*x1 + 5*x1^2 - x0*x2 - 4*x1*x2 - 2*x2^2 - x0*x3 - 4*x1*x3 - 6*x2*x3 + 4*x3^2, -5*x0^2 - 3*x0*x1 + 5*x1^2 - 3*x0*x2 + 5*x1*x2 + 6*x2^2 + 4*x0*x3 - x1*x3 + 4*x2*x3 - 2*x3^2) of Multivariate Polynomial Ring in x0, x1, x2, x3 over Finite Field of size 13
 
         TESTS::
@@ -825,19 +918,23 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         """
         K = self.base_ring()
         n = self.ambient().dimension()
-        A = matrix(K, [[K.random_element() for i in range(n+1)] for j in range(n+1)])
+        A = random_matrix(K, n+1, n+1)
         B = A.inverse()
-        f = rational_map(self.ambient(), self.ambient(), (matrix(self.ambient().coordinate_ring().gens()) * A).list())
-        g = rational_map(self.ambient(), self.ambient(), (matrix(self.ambient().coordinate_ring().gens()) * B).list())
-        Y = Embedded_projective_variety(self.ambient_space(), (g._to_ring_map()(self.defining_ideal())).gens())
+        f = rational_map(self.ambient(), self.ambient(), (matrix(self._ambient_ring_gens) * A).list())
+        g = rational_map(self.ambient(), self.ambient(), (matrix(self._ambient_ring_gens) * B).list())
+        phi = g._to_ring_map()
+        Y = Embedded_projective_variety(self.ambient_space(), (phi(self.defining_ideal())).gens())
         f = rational_map(self, Y, f.defining_polynomials())
         g = rational_map(Y, self, g.defining_polynomials())
-        assert(f.compose(g) == 1 and g.compose(f) == 1)
+        if __VALIDATE__:
+            assert(f.compose(g) == 1 and g.compose(f) == 1)
         f._is_isomorphism, f._is_birational, f._is_dominant, f._is_morphism = True, True, True, True
         g._is_isomorphism, g._is_birational, g._is_dominant, g._is_morphism = True, True, True, True
         f._inverse_rational_map = g
         g._inverse_rational_map = f
         Y._from_random_coordinate_change = f
+        # the substitution transforming the equations of subvarieties of self into those of their images in Y
+        Y._random_coordinate_change_ring_map = phi
         return Y
 
     def is_subset(self,Y):
@@ -859,14 +956,18 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         Y = _check_type_embedded_projective_variety(Y)
         if self is Y:
             return True
+        b = _memo_get(self._subset_tests, id(Y), Y)
+        if b is not None:
+            return b
         I = self.defining_ideal()
         J = Y.defining_ideal()
-        if I.ring() is not J.ring():
-            return False
-        for g in J.gens():
-            if not(g in I):
-                return False
-        return True
+        b = I.ring() is J.ring()
+        if b and not J.is_zero():
+            # for homogeneous ideals, a Groebner basis truncated in degree d decides membership of forms of degree at most d
+            G = ideal(I.groebner_basis(deg_bound=max(max(g.degree() for g in J.gens()),1)))
+            b = all(g == 0 for g in _reduce(J, G, attributes={G:{'isSB':1}}))
+        _memo_set(self._subset_tests, id(Y), Y, b)
+        return b
 
     def __eq__(self, Y):
         r"""Return ``True`` if ``self`` is mathematically equal to ``Y``, ``False`` otherwise.
@@ -889,6 +990,14 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             False
 
         """
+        Y = _check_type_embedded_projective_variety(Y)
+        if self is Y:
+            return True
+        if self.ambient_space() is not Y.ambient_space():
+            return False
+        for a in ("_dimension", "_degree", "_hilbert_polynomial"):
+            if hasattr(self, a) and hasattr(Y, a) and getattr(self, a) != getattr(Y, a):
+                return False
         if not self.is_subset(Y):
             return False
         return Y.is_subset(self)
@@ -964,17 +1073,20 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         except AttributeError:
             if self.codimension() == 0:
                 f = self.embedding_morphism(self)
-                assert(f.image() is self and f.is_dominant())
+                if __VALIDATE__:
+                    assert(f.image() is self and f.is_dominant())
+                f._is_dominant = True
                 self._parametrization = f
                 return self._parametrization
             if all(i == 1 for i in self.degrees_generators()):
                 I = self.defining_ideal()
-                M = jacobian(I.gens(),I.ring().gens()).change_ring(I.ring().base_ring())
-                assert((M * matrix([I.ring().gens()]).transpose()).list() == I.gens())
+                M = _linear_coefficient_matrix(I.gens(), I.ring())
                 P = ProjectiveSpace(self.dimension(), self.base_ring(), 'z')
                 polys = (matrix(P.coordinate_ring().gens()) * M.right_kernel_matrix()).list()
                 f = rational_map(P,self,polys)
-                assert(f.image() is self and f.is_dominant())
+                if __VALIDATE__:
+                    assert(f.image() is self and f.is_dominant())
+                f._is_dominant = True
                 self._parametrization = f
                 return self._parametrization
             X = macaulay2(self)
@@ -990,9 +1102,12 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             assert(psi.target() is self)
             return psi
 
-    def intersection(self, other):
+    def intersection(self, other, algorithm=None):
         r"""Return the scheme-theoretic intersection of ``self`` and ``other`` in their common ambient space.
 
+        If ``algorithm`` is given (e.g. ``'msolve'`` or ``'giac:gbasis'``), the saturation of the sum of the ideals
+        is computed from a Groebner basis obtained with ``groebner_basis(algorithm=algorithm)``, see :func:`_saturation_by_irrelevant_ideal`.
+
         EXAMPLES::
 
             sage: o = PP(5).empty()
@@ -1005,9 +1120,21 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         other = _check_type_embedded_projective_variety(other)
         if self.ambient() != other.ambient():
             raise ValueError("expected varieties in the same ambient projective space")
+        X = _memo_get(self._intersections, id(other), other)
+        if X is not None:
+            return _memo_copy(X)
         I = self.defining_ideal() + other.defining_ideal()
-        I = (I.saturation(I.ring().irrelevant_ideal()))[0]
-        return Embedded_projective_variety(self.ambient_space(),_minbase(I))
+        X = None
+        if len(self.degrees_generators()) == self.codimension() and len(other.degrees_generators()) == other.codimension():
+            # the sum of two complete intersections of expected codimension is again a complete intersection, hence saturated
+            X = Embedded_projective_variety(self.ambient_space(),_minbase(I))
+            if not(X.dimension() >= 0 and X.codimension() == self.codimension() + other.codimension()):
+                X = None
+        if X is None:
+            I = _saturation_by_irrelevant_ideal(I, algorithm=algorithm)
+            X = Embedded_projective_variety(self.ambient_space(),_minbase(I))
+        _memo_set(self._intersections, id(other), other, X)
+        return X
 
     def union(self, other):
         r"""Return the scheme-theoretic union of ``self`` and ``other`` in their common ambient space.
@@ -1055,9 +1182,12 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
     def __sub__(self, other):
         return self.difference(other)
 
-    def hyperplane_section(self, cache=True):
+    def hyperplane_section(self, cache=True, seed=None):
         r"""Return a random hyperplane section of the variety.
 
+        If ``seed`` is given, the hyperplane is chosen using that random seed, and the sections obtained
+        with different seeds are cached separately.
+
         OUTPUT:
 
         :class:`Embedded_projective_variety`, the intersection of ``self`` with a random hyperplane of the ambient projective space.
@@ -1075,18 +1205,45 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
             True
             sage: j.image()
             curve of degree 4 and arithmetic genus 0 in PP^5 cut out by 7 hypersurfaces of degrees (1, 2, 2, 2, 2, 2, 2)
+            sage: X.hyperplane_section(seed=1) is X.hyperplane_section(seed=1)
+            True
 
         """
-        if cache and hasattr(self,"_random_hyperplane_section"):
-            return self._random_hyperplane_section
+        if seed is not None:
+            if cache and seed in self._hyperplane_sections:
+                return self._hyperplane_sections[seed]
+            with randstate_seed(seed):
+                X = self.hyperplane_section(cache=False)
+            if cache:
+                self._hyperplane_sections[seed] = X
+            return X
+        if cache:
+            try:
+                return self._random_hyperplane_section
+            except AttributeError:
+                pass
         H = self.ambient().empty().random(1)
         j = H.parametrize().super().restriction_from_target(self)
         X = j.source()
-        X.embedding_as_hyperplane_section = lambda : j
+        X._embedding_as_hyperplane_section = j
         if cache:
             self._random_hyperplane_section = X
         return X
 
+    def embedding_as_hyperplane_section(self):
+        r"""Return the map from ``self`` to the variety of which ``self`` was constructed as a hyperplane section.
+
+        See :meth:`hyperplane_section`.
+
+        OUTPUT:
+
+        :class:`Rational_map_between_embedded_projective_varieties`
+        """
+        try:
+            return self._embedding_as_hyperplane_section
+        except AttributeError:
+            raise ValueError("the variety was not constructed as a hyperplane section")
+
     def _change_of_coordinates_first_fundamental_point(self):
         r"""Take an automorphism of the ambient projective space that sends the point ``self``
         to the point ``(1,0,...,0)``. This is an auxiliary function for :meth:`cone_of_lines`.
@@ -1096,10 +1253,10 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         while a[j0] == 0:
             j0 += 1
         n = self.ambient().dimension()
-        A = matrix(self.base_ring(), [a] + [[1 if i == j else 0 for i in range(n+1)] for j in range(n+1) if j != j0])
+        A = matrix(self.base_ring(), [a]).stack(identity_matrix(self.base_ring(), n+1).delete_rows([j0]))
         B = A.inverse()
-        f = rational_map(self.ambient(), self.ambient(), (matrix(self.ambient().coordinate_ring().gens()) * A).list())
-        g = rational_map(self.ambient(), self.ambient(), (matrix(self.ambient().coordinate_ring().gens()) * B).list())
+        f = rational_map(self.ambient(), self.ambient(), (matrix(self._ambient_ring_gens) * A).list())
+        g = rational_map(self.ambient(), self.ambient(), (matrix(self._ambient_ring_gens) * B).list())
         # assert(f.compose(g) == 1 and g(self)._coordinates() == [1]+[0 for i in range(n)])
         return (f,g)
 
@@ -1121,30 +1278,87 @@ class Embedded_projective_variety(AlgebraicScheme_subscheme_projective):
         if point is None:
             point = self.point()
         (f,g) = point._change_of_coordinates_first_fundamental_point()
-        x0 = self.ambient().coordinate_ring().gen()
+        x0 = self._ambient_ring_gens[0]
         polys = f._to_ring_map()(self.defining_ideal()).gens()
-        Z = [pol.subs({x0:0}) for pol in polys]
+        R = self._ambient_ring
+        Z = []
         for pol in polys:
-            Z.extend([pol.coefficient(x0 ** i) for i in range(1,pol.degree()+1)])
-        V = Embedded_projective_variety(self.ambient_space(), _minbase(g._to_ring_map()(ideal(Z))))
-        V = V.difference(point)
-        assert(V.is_subset(self) and (point.is_subset(V) or V.dimension() < 0))
+            Z.extend([R(c) for c in pol.polynomial(x0).list()])
+        # in these coordinates the cone is defined by forms in x1,...,xn, and its vertex (1,0,...,0) is removed by saturating there
+        J = R.ideal(Z).saturation(R.ideal(R.gens()[1:]))[0]
+        V = Embedded_projective_variety(self.ambient_space(), _minbase(g._to_ring_map()(J)))
+        if __VALIDATE__:
+            assert(V.is_subset(self) and (point.is_subset(V) or V.dimension() < 0))
 
         def fast_dec(degree=Infinity):
             if V.dimension() != 1:
                 raise ValueError("cone of lines must have dimension 1")
             Y = V.hyperplane_section()
-            h = rational_map([_random1(Y.ambient().coordinate_ring()),_random1(Y.ambient().coordinate_ring())])
+            h = rational_map(_random_linear_forms(Y.ambient().coordinate_ring(), 2))
             hY = h(Y)
             pts_on_PP1 = [q for q in hY.irreducible_components() if q.dimension() == 0 and q.degree() <= degree]
-            W = [(Y.embedding_as_hyperplane_section()(Y.intersection(h.inverse_image(q)))).union(point) for q in pts_on_PP1]
-            assert([(w.dimension(),w.degree()) for w in W] == [(0,q.degree()+1) for q in pts_on_PP1])
+            W = None
+            if len(pts_on_PP1) > 1 and all(len(q.defining_polynomials()) == 1 for q in pts_on_PP1):
+                # the forms of the points of PP^1 composed with h; since the two random linear forms of h have no common zero
+                # on the finite scheme Y, these cut the fibres of h on Y without saturating, so Y is cut once by their product
+                F = [q.defining_polynomials()[0](*h.defining_polynomials()) for q in pts_on_PP1]
+                Z = Y.intersection(Embedded_projective_variety(Y.ambient_space(), [prod(F)]))
+                C = Z.irreducible_components()
+                if sum([c.degree() for c in C]) == Z.degree():
+                    W = []
+                    for (q,f) in zip(pts_on_PP1,F):
+                        c = [z for z in C if z.degree() == q.degree() and f in z.defining_ideal()]
+                        if len(c) != 1:
+                            W = None
+                            break
+                        W.append(c[0])
+                    if W is not None and sum([w.degree() for w in W]) != Z.degree():
+                        W = None
+            if W is None:
+                W = [Y.intersection(h.inverse_image(q)) for q in pts_on_PP1]
+            W = [(Y.embedding_as_hyperplane_section()(w)).union(point) for w in W]
+            if __VALIDATE__:
+                assert([(w.dimension(),w.degree()) for w in W] == [(0,q.degree()+1) for q in pts_on_PP1])
             return W
 
         V._fast_decomposition = fast_dec
         V._vertex_point = point
         return V
 
+_empty_subschemes = WeakValueDictionary()
+
+# maximum number of results kept by the memos of is_subset, intersection and inverse_image
+_MEMO_SIZE = 16
+
+def _memo_get(memo, key, Y):
+    r"""Return the value stored in the bounded memo ``memo`` under ``key`` if it was computed for ``Y``, ``None`` otherwise (for internal use only)."""
+    entry = memo.get(key)
+    # keys are ids, the weak reference tells whether the id still belongs to Y without keeping Y alive
+    if entry is None or entry[0]() is not Y:
+        return None
+    memo.move_to_end(key)
+    return entry[1]
+
+def _memo_copy(X):
+    r"""Return a new :class:`Embedded_projective_variety` with the same equations as ``X`` and its already computed invariants (for internal use only).
+
+    The varieties stored by the memos of :meth:`Embedded_projective_variety.intersection` and :meth:`Rational_map_between_embedded_projective_varieties.inverse_image`
+    are not handed out twice, since callers store their own data on them (e.g. an embedding as hyperplane section):
+    only the data determined by the equations are shared.
+    """
+    Y = Embedded_projective_variety(X.ambient_space(), X.defining_polynomials())
+    for a in ("_dimension", "_degree", "_hilbert_polynomial", "_list_of_minimal_generators"):
+        if hasattr(X, a):
+            setattr(Y, a, getattr(X, a))
+    return Y
+
+def _memo_set(memo, key, Y, value):
+    r"""Store ``value``, computed for ``Y``, in the bounded memo ``memo`` under ``key``, discarding the least recently used entry if the memo is full (for internal use only)."""
+    memo[key] = (weak_ref(Y), value)
+    memo.move_to_end(key)
+    if len(memo) > _MEMO_SIZE:
+        memo.popitem(last=False)
+
 def _is_embedded_projective_variety(X):
     r"""whether ``X`` can be included in the class `Embedded_projective_variety``"""
     if isinstance(X,(Embedded_projective_variety,AlgebraicScheme_subscheme_projective)):
@@ -1312,11 +1526,18 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         if len(polys) != Y.ambient().dimension() + 1:
             raise ValueError("got wrong number of polynomials")
         H = X.Hom(Y)
-        gensR = matrix(polys).base_ring().gens()
-        if len(gensR) != X.ambient().coordinate_ring().ngens():
-            raise ValueError("expected polynomials in the coordinate ring of the source")
-        s = dict(zip(gensR, X.ambient().coordinate_ring().gens()))
-        polys = tuple([pol.subs(s) for pol in polys])
+        R = Sequence(polys).universe()
+        if R is not X.ambient().coordinate_ring():
+            gensR = R.gens()
+            if len(gensR) != X.ambient().coordinate_ring().ngens():
+                raise ValueError("expected polynomials in the coordinate ring of the source")
+            if isinstance(R, MPolynomialRing_base):
+                # the generators are renamed in order, so the exponent vectors are unchanged
+                S = X.ambient().coordinate_ring()
+                polys = tuple([S(pol.dict()) for pol in polys])
+            else:
+                s = dict(zip(gensR, X.ambient().coordinate_ring().gens()))
+                polys = tuple([pol.subs(s) for pol in polys])
         SchemeMorphism_polynomial_projective_space.__init__(self, H, polys)
         assert(self.domain() is X)
         assert(self.codomain() is Y)
@@ -1330,6 +1551,7 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         self._is_birational = None
         self._is_dominant = True if self.target().dimension() < 0 else None
         self._is_morphism = None
+        self._inverse_images = OrderedDict()
 
     def _repr_(self):
         r"""Return a string representation of the rational map
@@ -1347,7 +1569,8 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         if self.target().dimension() < 0:
             return("empty rational map" + "\nsource: " + self.source()._repr_() + "\ntarget: " + self.target()._repr_())
         type_map = "rational map"
-        if hasattr(self,"_base_locus") or hasattr(self,"_list_of_representatives_of_map"):
+        if self._is_morphism is None and hasattr(self,"_base_locus"):
+            # the base locus is printed below anyway; representatives alone are not enough to decide cheaply
             self.is_morphism()
         if self._is_morphism is True:
             type_map = "morphism"
@@ -1392,7 +1615,7 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         if self.target().dimension() < 0:
             return("\\mbox{empty rational map}" + "\\newline \\mbox{source: }" + latex(self.source()) + "\\newline \\mbox{target: }" + latex(self.target()))
         type_map = "rational map"
-        if hasattr(self,"_base_locus") or hasattr(self,"_list_of_representatives_of_map"):
+        if self._is_morphism is None and hasattr(self,"_base_locus"):
             self.is_morphism()
         if self._is_morphism is True:
             type_map = "morphism"
@@ -1508,6 +1731,11 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
 
         :class:`Embedded_projective_variety`,  the closure of the image of ``self``, a subvariety of ``self.target()``.
 
+        By default, the Groebner basis of the ideal of the graph is computed with ``Singular``'s ``slimgb`` over prime finite fields
+        and with ``modStd`` over the rationals. With ``algorithm='gwalk'``, a degree reverse lexicographic Groebner basis of the ideal of the graph
+        is computed first and then converted with the Groebner walk into a lexicographic Groebner basis; since the variables of the source
+        come first, its elements involving only the variables of the target generate the elimination ideal.
+
         EXAMPLES::
 
             sage: f = veronese(1,4)
@@ -1519,6 +1747,8 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             sage: f = f.restriction(f.source().point())
             sage: p = f.image(algorithm="built-in_kernel_ring_map")
             sage: assert(p._is_point())
+            sage: veronese(1,4).image(algorithm="gwalk")
+            curve of degree 4 and arithmetic genus 0 in PP^4 cut out by 6 hypersurfaces of degree 2
 
         """
         if self._is_dominant is True:
@@ -1532,18 +1762,44 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
                 K = self.source().base_ring()
                 n = self.source().ambient().dimension()
                 m = self.target().ambient().dimension()
-                R = PolynomialRing(K,n+m+2,['x'+str(i) for i in range(n+1)]+['y'+str(j) for j in range(m+1)])
+                R = _graph_ring(K, n, m)
                 x = R.gens()[:n+1]
                 y = R.gens()[n+1:]
-                s = dict(zip(self.source().ambient().coordinate_ring().gens(),x))
-                F = [pol.subs(s) for pol in self.defining_polynomials()]
+                s = self.source().ambient_space().coordinate_ring().hom(x, R)
+                F = [s(pol) for pol in self.defining_polynomials()]
                 I = [y[i] - F[i] for i in range(m+1)]
                 if self.source().codimension() > 0:
-                    I += [pol.subs(s) for pol in self.source().coordinate_ring().defining_ideal().gens()]
-                I_sat = ideal(I).saturation(ideal(x))[0]
-                I_sat_elim = I_sat.elimination_ideal(x,algorithm=algorithm)
+                    I += [s(pol) for pol in self.source().coordinate_ring().defining_ideal().gens()]
+                X = self.source()
+                if X.codimension() == 0 or (X.dimension() >= 0 and len(X.degrees_generators()) == X.codimension()):
+                    # the ideal of the source is saturated, hence so is the ideal of the graph
+                    I_sat = R.ideal(I)
+                else:
+                    I_sat = ideal(I).saturation(ideal(x))[0]
+                if algorithm is None:
+                    # R has a block order eliminating x: the elements of a Groebner basis involving only y generate the elimination ideal
+                    if K is QQ:
+                        G = _modular_groebner_basis(I_sat)
+                    elif K.is_finite() and K.is_prime_field():
+                        G = I_sat.groebner_basis('libsingular:slimgb')
+                    else:
+                        G = I_sat.groebner_basis()
+                    I_sat_elim = R.ideal([g for g in G if all(v in y for v in g.variables())])
+                elif algorithm == 'gwalk':
+                    # the ideal of the graph is never zero-dimensional, so FGLM does not apply; the walk returns a lexicographic basis
+                    R0 = R.change_ring(order='degrevlex')
+                    J = R0.ideal([R0(g) for g in I_sat.gens()])
+                    G = [R(g) for g in J.transformed_basis('gwalk')]
+                    I_sat_elim = R.ideal([g for g in G if all(v in y for v in g.variables())])
+                else:
+                    I_sat_elim = I_sat.elimination_ideal(x,algorithm=algorithm)
+                if self.target().codimension() == 0 and I_sat_elim.is_zero():
+                    self._closure_of_image = self.target()
+                    self._is_dominant = True
+                    return self._closure_of_image
                 t = dict(zip(y,self.target().ambient().coordinate_ring().gens()))
-                self._closure_of_image = Embedded_projective_variety(self.target().ambient_space(), _minbase(I_sat_elim.subs(t)))
+                I_sat_elim = I_sat_elim.subs(t)
+                self._closure_of_image = Embedded_projective_variety(self.target().ambient_space(), _minbase(I_sat_elim) if I_sat_elim.ngens() > 1 else I_sat_elim.gens())
             if self._closure_of_image == self.target():
                 self._closure_of_image = self.target()
                 self._is_dominant = True
@@ -1579,12 +1835,17 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             raise ValueError("expected a subvariety of the source variety")
         return self.restriction(Z).image()
 
-    def inverse_image(self, Z, trim=True):
+    def inverse_image(self, Z, trim=True, saturation_strategy='random_linear'):
         r"""Return the (closure of the) inverse image of the variety ``Z`` via the rational map ``self``.
 
         INPUT:
 
         - ``Z``:class:`Embedded_projective_variety` -- a subvariety of ``self.target().ambient()``.
+        - ``saturation_strategy`` -- one of ``'random_linear'`` (default), ``'full'`` and ``'iterated_colon'``.
+          The pullback of the ideal of ``Z`` is saturated with respect to the ideal generated by the forms defining the map:
+          with ``'random_linear'`` this ideal is replaced by a random linear combination of its generators when they all have the same degree,
+          with ``'full'`` the whole ideal is used, and with ``'iterated_colon'`` the saturation is computed
+          as a stable sequence of ideal quotients by the whole ideal.
 
         OUTPUT:
 
@@ -1621,64 +1882,92 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
 
         """
         Z = _check_type_embedded_projective_variety(Z)
+        if saturation_strategy not in ('random_linear', 'full', 'iterated_colon'):
+            raise ValueError("saturation_strategy must be one of 'random_linear', 'full' and 'iterated_colon'")
+        X = _memo_get(self._inverse_images, (id(Z),trim,saturation_strategy), Z)
+        if X is not None:
+            return _memo_copy(X)
         if not Z.is_subset(self.super().target()):
             raise ValueError("expected a subvariety of the ambient target space")
-        phi = self.super()._to_ring_map()
-        B = ideal([phi(g) for g in phi.domain().gens()])
-        J = Z.defining_ideal()
-        phiJ = phi(J)
+        phi, B = self._inverse_image_context()
+        if saturation_strategy == 'random_linear':
+            B = _random_contraction(B)
+        phiJ = phi(Z.defining_ideal())
         R = phi.codomain()
-        assert(R is self.source().coordinate_ring() and phiJ.ring() is R and B.ring() is R)
+        assert(phiJ.ring() is R)
         if hasattr(R,"ambient") and hasattr(R,"defining_ideal"):
             phiJ = ideal([R.lift(g) for g in phiJ.gens()]) + R.defining_ideal()
-            B = ideal([R.lift(b) for b in B.gens()]) + R.defining_ideal()
-        assert(phiJ.ring() is self.source().ambient_space().coordinate_ring() and B.ring() is self.source().ambient_space().coordinate_ring())
-        K = B.ring().base_ring()
-        if len(set([b.degree() for b in B.gens()])) == 1:
-            B = ideal(sum([K.random_element() * b for b in B.gens()]))
-            assert(B.is_homogeneous())
-        F = (phiJ.saturation(B))[0]
+        assert(phiJ.ring() is B.ring())
+        if saturation_strategy == 'iterated_colon':
+            F = phiJ
+            F_new = F.quotient(B)
+            while F_new != F:
+                F = F_new
+                F_new = F.quotient(B)
+        else:
+            F = (phiJ.saturation(B))[0]
         assert(F.ring() is self.source().ambient_space().coordinate_ring())
-        if trim:
+        if trim and F.ngens() > 1:
             polys = _minbase(F)
         else:
             polys = F.gens()
-        return Embedded_projective_variety(self.source().ambient_space(), polys)
-
-    def _0th_projective_degree(self):
-        r"""Return the first projective degree of the rational map (for internal use only)."""
-        if self.source().dimension() > self.target().dimension():
-            return 0
-        L = self.target().empty().random(*[1 for i in range(self.source().dimension())])
-        F = self.inverse_image(L,trim=False)
-        assert(F.dimension() <= 0)
-        if F.dimension() != 0:
-            return 0
-        return F.degree()
-
-    def _restriction_to_general_hyperplane(self):
-        r"""Return the restriction of the rational map to a random hyperplane section of the source variety (for internal use only).
+        X = Embedded_projective_variety(self.source().ambient_space(), polys)
+        _memo_set(self._inverse_images, (id(Z),trim,saturation_strategy), Z, X)
+        return X
 
-        TESTS::
+    def _inverse_image_context(self):
+        r"""Return the data used by :meth:`inverse_image` which do not depend on the subvariety (for internal use only).
 
-            sage: f = rational_map(Veronese(1,4)).make_dominant()
-            sage: f._restriction_to_general_hyperplane()
-            rational map defined by forms of degree 2
-            source: PP^3
-            target: quadric hypersurface in PP^5
-            sage: f.inverse(verbose=False)._restriction_to_general_hyperplane()   # optional - macaulay2
-            rational map defined by forms of degree 2
-            source: quadric hypersurface in PP^4
-            target: PP^4
+        OUTPUT:
 
+        A pair ``(phi, B)``, where ``phi`` is the ring map associated to ``self.super()``
+        and ``B`` is the ideal in the coordinate ring of the ambient space of the source with respect to which the saturation is taken.
+        The random linear combination of the generators of ``B`` used by default is not part of these data:
+        it is drawn at every call with :func:`_random_contraction`, so that a bad choice does not affect later inverse images.
         """
-        j = self.source().empty().random(1).parametrize().super()
-        if self.source().codimension() == 0:
-            return j.compose(self)
-        j = rational_map(j.inverse_image(self.source()), self.source(), j.defining_polynomials())
-        return j.compose(self)
+        try:
+            return self._inverse_image_context_data
+        except AttributeError:
+            phi = self.super()._to_ring_map()
+            R = phi.codomain()
+            B = R.ideal(phi.im_gens())
+            assert(R is self.source().coordinate_ring())
+            if hasattr(R,"ambient") and hasattr(R,"defining_ideal"):
+                B = ideal([R.lift(b) for b in B.gens()]) + R.defining_ideal()
+            assert(B.ring() is self.source().ambient_space().coordinate_ring())
+            if B.ngens() > 1:
+                # done once per map: every saturation with respect to B works with a minimal set of generators
+                B = B.ring().ideal(_minbase(B))
+            self._inverse_image_context_data = (phi, B)
+            return self._inverse_image_context_data
+
+    def _0th_projective_degree(self, k=0):
+        r"""Return the first projective degree of the restriction of the rational map to ``k`` general hyperplane sections of the source (for internal use only).
+
+        This is the degree of the intersection of the closure of the inverse image of a general linear subspace
+        of codimension ``self.source().dimension() - k`` with ``k`` general hyperplanes of the ambient space of the source.
+        """
+        r = self.source().dimension() - k
+        if r > self.target().dimension():
+            return 0
+        phi, B = self._inverse_image_context()
+        B = _random_contraction(B)
+        L = self.target().empty().random(*[1 for i in range(r)])
+        phiJ = phi(L.defining_ideal())
+        R = phi.codomain()
+        if hasattr(R,"ambient") and hasattr(R,"defining_ideal"):
+            phiJ = ideal([R.lift(g) for g in phiJ.gens()]) + R.defining_ideal()
+        S = B.ring()
+        if k > 0:
+            phiJ = phiJ + S.ideal(_random_linear_forms(S, k))
+        F = phiJ.saturation(B)[0]
+        d = F.dimension() - 1
+        assert(d <= 0)
+        if d != 0:
+            return 0
+        return Integer(F.hilbert_polynomial()[0])
 
-    def projective_degrees(self):
+    def projective_degrees(self, parallel=False):
         r"""Return the projective degrees of the rational map
 
         .. WARNING::
@@ -1686,6 +1975,11 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             Currently, this uses a probabilistic approach which could give wrong answers
             (especially over finite fields of small order).
 
+        INPUT:
+
+        - ``parallel`` -- a boolean (default: ``False``); if ``True``, the projective degrees
+          are computed in parallel by forked processes (see :func:`sage.parallel.decorate.parallel`).
+
         OUTPUT:
 
         A list of integers.
@@ -1717,18 +2011,32 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         try:
             return self._projective_degrees_list
         except AttributeError:
-            self._projective_degrees_list = []
-            psi = self
-            for i in range(self.source().dimension()):
-                self._projective_degrees_list.append(psi._0th_projective_degree())
-                psi = psi._restriction_to_general_hyperplane()
+            # the restrictions to general linear sections of the source are not constructed:
+            # the hyperplanes are added to the pullback of a general linear subspace, and the data of ``self`` are used throughout
+            n = self.source().dimension()
+            if parallel and n > 1:
+                from sage.parallel.decorate import parallel as sage_parallel
+                D = dict([(a[0][0], d) for (a, d) in sage_parallel(p_iter='fork', reseed_rng=True)(self._0th_projective_degree)(list(range(n)))])
+                # a forked process which fails returns a string instead of an integer
+                if not all(isinstance(D.get(k),(int,Integer)) for k in range(n)):
+                    raise RuntimeError("parallel computation of projective degrees failed")
+                self._projective_degrees_list = [D[k] for k in range(n)]
+            else:
+                self._projective_degrees_list = [self._0th_projective_degree(k) for k in range(n)]
             self._projective_degrees_list.append(self.source().degree())
             self._projective_degrees_list.reverse()
             return self._projective_degrees_list
 
-    def is_dominant(self):
+    def is_dominant(self, probabilistic=False):
         r"""Return ``True`` if ``self`` is a dominant rational map, ``False`` otherwise.
 
+        INPUT:
+
+        - ``probabilistic`` -- a boolean (default: ``False``); if ``True``, the base field is finite and the answer is not already known,
+          the fibre over a random point of the target is computed instead of the image:
+          its dimension is ``self.source().dimension() - self.target().dimension()`` if ``self`` is dominant,
+          and it is empty otherwise. The answer obtained in this way is not cached.
+
         OUTPUT:
 
         :class:`bool`, whether ``self.image() == self.target()``
@@ -1741,8 +2049,31 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             sage: g = f.make_dominant()
             sage: g.is_dominant()
             True
+            sage: veronese(1,3).is_dominant(probabilistic=True)
+            False
+            sage: g = rational_map(Veronese(1,4)).make_dominant()
+            sage: h = rational_map(g.source(), g.target(), g.defining_polynomials())
+            sage: h.is_dominant(probabilistic=True)
+            True
+            sage: P = PP(2)
+            sage: x0, x1, x2 = P.coordinate_ring().gens()
+            sage: rational_map(P, P, [x0^2, x0*x1, x1^2]).is_dominant(probabilistic=True)
+            False
 
         """
+        # random points of subvarieties are only found over finite fields, so over other fields the exact test is used
+        if probabilistic and self._is_dominant is None and self.base_ring().is_finite() and self.source().dimension() >= self.target().dimension():
+            F = self.inverse_image(self.target().point(verbose=False))
+            if F.dimension() == self.source().dimension() - self.target().dimension():
+                return True
+            if F.dimension() < 0:
+                return False
+        if self._is_dominant is None and hasattr(self,"_projective_degrees_list") and self.source().dimension() == self.target().dimension():
+            # the last projective degree is nonzero if and only if the image has the same dimension as the source
+            if self._projective_degrees_list[-1] == 0:
+                self._is_dominant = False
+            elif self.target().codimension() == 0:
+                self._is_dominant = True
         if self._is_dominant is None:
             self._is_dominant = self.image() == self.target()
         return self._is_dominant
@@ -1801,7 +2132,12 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             Y = f.target()
         else:
             Y = f.codomain()
-        g = Rational_map_between_embedded_projective_varieties(self.source(),Y,g.defining_polynomials())
+        polys = g.defining_polynomials()
+        same_polys = polys == self.defining_polynomials()
+        if same_polys:
+            # share the forms of ``self`` instead of storing an equal copy
+            polys = self.defining_polynomials()
+        g = Rational_map_between_embedded_projective_varieties(self.source(),Y,polys)
         if isinstance(f,Rational_map_between_embedded_projective_varieties):
             if self._is_isomorphism is True and f._is_isomorphism is True:
                 g._is_isomorphism = True
@@ -1811,6 +2147,11 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
                 g._is_dominant = True
             if self._is_morphism is True and f._is_morphism is True:
                 g._is_morphism = True
+        if same_polys and g.target() is self.target():
+            # e.g. composition with the identity of the target: the cached conversions of ``self`` are still valid
+            for a in ("_Rational_map_between_embedded_projective_varieties__to_ring_map", "_to_built_in_map", "_macaulay2_object"):
+                if hasattr(self, a):
+                    setattr(g, a, getattr(self, a))
         return g
 
     def restriction(self,X):
@@ -1837,6 +2178,8 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             target: PP^4
 
         """
+        if X is self.source():
+            return self
         Y = None if self.source().codimension() == 0 else self.source()
         j = X.embedding_morphism(Y)
         return(j.compose(self))
@@ -1893,7 +2236,7 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             F = macaulay2([list(self.defining_polynomials())])
             F = F.matrix().substitute(X.ambient().ring().vars()).entries()
             Y = macaulay2(self.target())
-            if (macaulay2('SpecialFanoFourfolds.Options.Version >= "2.7.1"')).sage():
+            if _macaulay2_version_ok():
                 self._macaulay2_object = X.Hom(Y)._operator(' ',F)
             else:
                 h = (X.ring().map(Y.ring(),F.flatten())).rationalMap().multirationalMap()
@@ -1929,13 +2272,23 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             return False
         F = self.defining_polynomials()
         G = other.defining_polynomials()
-        R = self.source().coordinate_ring()
-        M = matrix(R,[F,G])
-        for P in M.minors(2):
-            if not P.is_zero():
+        if self.source().codimension() == 0:
+            # quick test: the two lists of forms are not proportional at a random point
+            K = self.source().base_ring()
+            a = [K.random_element() for i in range(len(self.source()._ambient_ring_gens))]
+            if matrix(K, [[f(a) for f in F], [g(a) for g in G]]).rank() == 2:
                 return False
-        else:
-            return True
+        R = self.source().coordinate_ring()
+        F = [R(f) for f in F]
+        G = [R(g) for g in G]
+        for i in range(len(F)):
+            fi, gi = F[i], G[i]
+            if fi.is_zero() and gi.is_zero():
+                continue
+            for j in range(i+1, len(F)):
+                if not (fi*G[j] - F[j]*gi).is_zero():
+                    return False
+        return True
 
     def __ne__(self,other):
         return(not(self.__eq__(other)))
@@ -1950,7 +2303,9 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         EXAMPLES::
 
             sage: f = veronese(1,5).make_dominant()
-            sage: g = f.inverse(); g                                         # optional - macaulay2
+            sage: g = f.inverse(); g.is_morphism()                           # optional - macaulay2
+            True
+            sage: g                                                          # optional - macaulay2
             birational morphism defined by forms of degree 1
             source: curve of degree 5 and arithmetic genus 0 in PP^5 cut out by 10 hypersurfaces of degree 2
             target: PP^1
@@ -1963,6 +2318,9 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         """
         if hasattr(self,"_inverse_rational_map"):
             return self._inverse_rational_map
+        g = self._linear_inverse()
+        if g is not None:
+            return g
         if self._is_birational is None and self.source().dimension() != self.target().dimension():
             self._is_birational = False
         if self._is_birational is False or self._is_dominant is False:
@@ -1973,14 +2331,19 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             raise TypeError("expected True or False")
         if algorithm != 'macaulay2':
             raise NotImplementedError("inverse of a birational map using built-in functions")
-        f = macaulay2(self)
-        if verbose:
-            print("-- running Macaulay2 function inverse()... --")
         try:
-            g = f.inverse(macaulay2("Verify")._operator('=>',macaulay2(-1)))
-        except Exception as err:
-            raise RuntimeError(err)
-        g = _from_macaulay2map_to_sagemap(g, self.target(), self.source())
+            # computed by an earlier call with check=False
+            g = self._macaulay2_inverse_map
+        except AttributeError:
+            f = macaulay2(self)
+            if verbose:
+                print("-- running Macaulay2 function inverse()... --")
+            try:
+                g = f.inverse(macaulay2("Verify")._operator('=>',macaulay2(-1)))
+            except Exception as err:
+                raise RuntimeError(err)
+            g = _from_macaulay2map_to_sagemap(g, self.target(), self.source())
+            self._macaulay2_inverse_map = g
         assert(g.source() is self.target() and g.target() is self.source())
         if check:
             p = self.source().point(verbose=False, algorithm=algorithm)
@@ -1995,6 +2358,33 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             self._inverse_rational_map = g
         return g
 
+    def _linear_inverse(self):
+        r"""Return the inverse of ``self`` if ``self`` is a linear automorphism of a projective space, ``None`` otherwise (for internal use only).
+
+        The inverse is obtained by inverting the matrix of the coefficients of the linear forms defining ``self``.
+
+        TESTS::
+
+            sage: f = PP(3).random_coordinate_change()._from_random_coordinate_change
+            sage: g = rational_map(f.source(), f.target(), f.defining_polynomials())
+            sage: g._linear_inverse().compose(g) == 1
+            True
+
+        """
+        X = self.source()
+        Y = self.target()
+        if not (self._degree_forms() == 1 and X.codimension() == 0 and Y.codimension() == 0 and X.dimension() == Y.dimension()):
+            return None
+        M = _linear_coefficient_matrix(self.defining_polynomials(), X._ambient_ring)
+        if not M.is_invertible():
+            return None
+        g = Rational_map_between_embedded_projective_varieties(Y, X, (M.inverse() * vector(Y._ambient_ring, Y._ambient_ring_gens)).list())
+        for h in (self, g):
+            h._is_isomorphism, h._is_birational, h._is_dominant, h._is_morphism = True, True, True, True
+        g._inverse_rational_map = self
+        self._inverse_rational_map = g
+        return g
+
     def _representatives(self, verbose=None, algorithm='macaulay2'):
         r"""Return a minimal set of generators for the module of representatives of the rational map ``self``.
 
@@ -2009,15 +2399,19 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
                 raise TypeError("expected True or False")
             if algorithm != 'macaulay2':
                 raise NotImplementedError("representatives of a rational map using built-in functions")
-            f = macaulay2(self).toRationalMap()
+            try:
+                f = self._macaulay2_rational_map
+            except AttributeError:
+                f = macaulay2(self).toRationalMap()
+                self._macaulay2_rational_map = f
             if verbose:
                 print("-- running Macaulay2 function to compute representatives of map... --")
             n = f.maps().length().sage()
-            assert(isinstance(n,(int,Integer)))
+            if __debug__:
+                assert(isinstance(n,(int,Integer)))
             reprs = [macaulay2(i).matrix(f).entries().flatten().sage() for i in range(n)]
-            s = dict(zip(matrix(reprs).base_ring().gens(), self.source().ambient_space().coordinate_ring().gens()))
-            reprsN = [[pol.subs(s) for pol in repr] for repr in reprs]
-            maps = [Rational_map_between_embedded_projective_varieties(self.source(),self.target(),F) for F in reprsN]
+            # the constructor moves the forms into the coordinate ring of the source
+            maps = [Rational_map_between_embedded_projective_varieties(self.source(),self.target(),F) for F in reprs]
             if verbose:
                 print("-- computation of representatives has terminated. --")
             self._list_of_representatives_of_map = maps
@@ -2049,7 +2443,7 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
         try:
             return self._base_locus
         except AttributeError:
-            I = ideal(matrix([f.defining_polynomials() for f in self._representatives(verbose=verbose,algorithm=algorithm)]).minors(1))
+            I = ideal(list(set([g for f in self._representatives(verbose=verbose,algorithm=algorithm) for g in f.defining_polynomials() if g != 0])))
             I = I + self.source().defining_ideal()
             I = (I.saturation(I.ring().irrelevant_ideal()))[0]
             self._base_locus = Embedded_projective_variety(self.source().ambient_space(),_minbase(I))
@@ -2113,7 +2507,7 @@ class Rational_map_between_embedded_projective_varieties(SchemeMorphism_polynomi
             rational map defined by forms of degree 3
             source: PP^1
             target: PP^3
-            sage: g.defining_polynomials()
+            sage: g.defining_polynomials()     # random
             (-t0^3 - 6*t0^2*t1 - t0*t1^2 - 6*t1^3,
             5*t0^3 - 4*t0^2*t1 - 5*t0*t1^2 - 2*t1^3,
             4*t0^3 + 4*t0^2*t1 + t0*t1^2 + 4*t1^3,
@@ -2338,7 +2732,8 @@ def surface(*args, KK=33331, ambient=None, nodes=None, virtual=False, class_surf
         if nodes is not None:
             raise NotImplementedError("keyword 'nodes' not supported with virtual='True'")
         if class_surfaces == 'rational':
-            T = _Virtual_projective_surface(ambient=binomial(v[0]+2,2) - 1, degree=v[0] ** 2, sectional_genus=binomial(v[0]-1,2), constant_coefficient_hilbert_polynomial=1, topological_euler_characteristic=3, KK=KK)
+            a = Integer(v[0])
+            T = _Virtual_projective_surface(ambient=(a+2)*(a+1)//2 - 1, degree=a ** 2, sectional_genus=(a-1)*(a-2)//2, constant_coefficient_hilbert_polynomial=1, topological_euler_characteristic=3, KK=KK)
         elif class_surfaces == 'K3':
             T = _Virtual_projective_surface(ambient=v[0], degree=2*v[0] - 2, sectional_genus=v[0], constant_coefficient_hilbert_polynomial=2, topological_euler_characteristic=24, KK=KK)
         else:
@@ -2367,28 +2762,33 @@ def surface(*args, KK=33331, ambient=None, nodes=None, virtual=False, class_surf
         return _from_macaulay2_to_sage(E.removeUnderscores(), PP(E.ambient().dim().sage(), KK=KK).ambient_space())
     R = PP(2,KK=KK,var='t').coordinate_ring()
     I = ideal(R.one())
-    for i in range(1,len(v)):
-        for j in range(v[i]):
-            I = I.intersection((ideal([_random1(R), _random1(R)]) ** i))
-    I = I.saturation(ideal(R.gens()))[0]
+    multiplicities = [i for i in range(1,len(v)) for j in range(v[i])]
+    L = _random_linear_forms(R, 2*len(multiplicities))
+    base_points = [ideal([L[2*k], L[2*k+1]]) ** i for k, i in enumerate(multiplicities)]
+    if len(base_points) > 0:
+        I = _balanced_reduction(base_points, lambda A, B: A.intersection(B))
+    I = I.saturation(R.irrelevant_ideal())[0]
     f = rational_map(projective_variety(I),v[0])
     if nodes is not None:
         if not isinstance(nodes,(int,Integer)):
             raise TypeError("nodes must be an integer")
         if nodes > 0:
-            N = f.target().empty()
+            X = f.source()
+            pts = []
             for i in range(nodes):
-                p1 = f(f.source().point(verbose=False))
-                p2 = f(f.source().point(verbose=False))
-                N = N.union((p1.union(p2)).linear_span().point(verbose=False))
+                p1 = f(X.point(verbose=False))
+                p2 = f(X.point(verbose=False))
+                pts.append((p1.union(p2)).linear_span().point(verbose=False))
+            N = _balanced_reduction(pts, lambda A, B: A.union(B))
             f = f.compose(rational_map(N.linear_span()))
     ambient_changed = False
     if ambient is not None:
         if not isinstance(ambient,(int,Integer)):
             raise TypeError("ambient must be an integer")
-        if ambient != f.target().dimension():
-            H = [_random1(f.target().coordinate_ring()) for i in range(ambient+1)]
-            h = rational_map(f.target(),None,H)
+        Y = f.target()
+        if ambient != Y.dimension():
+            H = _random_linear_forms(Y.coordinate_ring(), ambient+1)
+            h = rational_map(Y,None,H)
             f = f.compose(h)
             ambient_changed = True
     S = f.image()
@@ -2428,6 +2828,7 @@ class _Virtual_projective_surface(Embedded_projective_variety):
         self._sectional_genus = sectional_genus
         self._constant_coefficient_hilbert_polynomial = constant_coefficient_hilbert_polynomial
         self._topological_euler_characteristic = topological_euler_characteristic
+        self._dim_homogeneous_components = {}
 
     def _repr_(self):
         r"""Return a string representation of the virtual surface."""
@@ -2456,7 +2857,12 @@ class _Virtual_projective_surface(Embedded_projective_variety):
 
     def _dim_homogeneous_component(self, n):
         r"""Return the expected dimension for the homogeneous component of degree ``n`` of the defining ideal of the virtual surface."""
-        return max(Integer(binomial(self.ambient().dimension()+n,n) - self.hilbert_polynomial()(n)), 0)
+        if n not in self._dim_homogeneous_components:
+            # the Hilbert polynomial evaluated in integer arithmetic: d*n*(n+1)/2 + (1-g)*n + chi
+            hp = self._degree*n*(n+1)//2 + (1-self._sectional_genus)*n + self._constant_coefficient_hilbert_polynomial
+            m = ZZ(self.ambient().dimension()+n).binomial(n) - hp
+            self._dim_homogeneous_components[n] = m if m > 0 else ZZ.zero()
+        return self._dim_homogeneous_components[n]
 
     def projection(self, *args):
         r"""Return a general projection of the virtual surface.
@@ -2475,11 +2881,17 @@ class _Virtual_projective_surface(Embedded_projective_variety):
         for i in v:
             if not(isinstance(i,(Integer,int))):
                 raise TypeError("expected a tuple of integers")
-        N = self.ambient().dimension() - sum([r * binomial(i+1,2) for i, r in enumerate(v, start=1)])
-        degS = self.degree() - sum([r * (i ** 2) for i, r in enumerate(v, start=1)])
-        gS = self.sectional_genus() - sum([r * binomial(i,2) for i, r in enumerate(v, start=1)]) # [Hartshorne's book, p. 389, Cor. 3.7]
+        s1, s2, s3, s4 = 0, 0, 0, 0
+        for i, r in enumerate(v, start=1):
+            s1 += r * (i*(i+1)//2)
+            s2 += r * i*i
+            s3 += r * (i*(i-1)//2)
+            s4 += r
+        N = self.ambient().dimension() - s1
+        degS = self.degree() - s2
+        gS = self.sectional_genus() - s3 # [Hartshorne's book, p. 389, Cor. 3.7]
         chiOS = self._constant_coefficient_hilbert_polynomial
-        KS2 = 12*self._constant_coefficient_hilbert_polynomial - self.topological_euler_characteristic() - sum(v)
+        KS2 = 12*self._constant_coefficient_hilbert_polynomial - self.topological_euler_characteristic() - s4
         c2TS = 12*chiOS - KS2
         S = _Virtual_projective_surface(ambient=N, degree=degS, sectional_genus=gS, constant_coefficient_hilbert_polynomial=chiOS, topological_euler_characteristic=c2TS, KK=self.ambient().base_ring())
         if hasattr(self, "_minimal_model"):
@@ -2516,12 +2928,15 @@ class _Virtual_projective_surface(Embedded_projective_variety):
             raise RuntimeError("failed to materialize the virtual surface, wrong sectional genus")
         if S.hilbert_polynomial().constant_coefficient() != self.hilbert_polynomial().constant_coefficient():
             raise RuntimeError("failed to materialize the virtual surface, wrong Hilbert polynomial")
-        if S.linear_span().codimension() != self._dim_homogeneous_component(1):
+        c = S.linear_span().codimension()
+        if c != self._dim_homogeneous_component(1):
             raise RuntimeError("failed to materialize the virtual surface, wrong linear span")
-        if S.linear_span().codimension() == 0:
-            if S.degrees_generators().count(2) != self._dim_homogeneous_component(2):
+        if c == 0:
+            degs = S.degrees_generators()
+            c2 = degs.count(2)
+            if c2 != self._dim_homogeneous_component(2):
                 print("warning: got wrong number of quadrics in materialization of virtual surface")
-            elif S.degrees_generators().count(2) == 0 and S.degrees_generators().count(3) != self._dim_homogeneous_component(3):
+            elif c2 == 0 and degs.count(3) != self._dim_homogeneous_component(3):
                 print("warning: got wrong number of cubics in materialization of virtual surface")
         if S.topological_euler_characteristic() != self.topological_euler_characteristic():
             raise RuntimeError("failed to materialize the virtual surface, wrong topological Euler characteristic")
@@ -2598,20 +3013,30 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             raise ValueError("expected a fourfold")
         if S.dimension() != 2:
             raise ValueError("expected a surface")
-        if not S.is_subset(X):
+        presumed = __PRESUME_VERIFIED__
+        if presumed:
+            check = False
+        if not presumed and not S.is_subset(X):
             raise ValueError("the surface must be contained in the fourfold")
         if V is None and self.ambient().dimension() == 5:
             V = self.ambient()
         if V is not None:
             if V.dimension() != 5:
                 raise ValueError("expected a fivefold")
-            if not X.is_subset(V):
+            if not presumed and not X.is_subset(V):
                 raise ValueError("the fourfold must be contained in the fivefold")
-            if check and V.singular_locus().dimension() >= 0:
-                raise ValueError("the ambient fivefold is not smooth")
+            if check and not hasattr(V,"_verified_smooth"):
+                if V.singular_locus().dimension() >= 0:
+                    raise ValueError("the ambient fivefold is not smooth")
+                V._verified_smooth = True
             self._ambient_fivefold = V
-        if check and self.singular_locus().dimension() >= 0:
-            raise ValueError("the fourfold is not smooth")
+        if check:
+            # the smoothness of X is recorded on X, so that other fourfolds constructed from X do not check it again
+            if not hasattr(X,"_verified_smooth"):
+                if self.singular_locus().dimension() >= 0:
+                    raise ValueError("the fourfold is not smooth")
+                X._verified_smooth = True
+            self._verified_smooth = True
         self._surface = S
 
     def _repr_(self):
@@ -2688,7 +3113,9 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             c2TS = S.topological_euler_characteristic(verbose=verbose)
             KS2 = 12*chiOS-c2TS
             n = S._finite_number_of_nodes if hasattr(S,"_finite_number_of_nodes") else 0
-            S2 = 2*n + (binomial(r+5,2) - (r+5)*(sum(a)) + (sum(a)) ** 2 - sum([a[i]*a[j] for i in range(r) for j in range(i+1,r)])) * HS2 + (r+5-sum(a)) * KSHS + KS2 - c2TS
+            sa = sum(a)
+            cross = (sa ** 2 - sum([x ** 2 for x in a])) // 2 # sum of a[i]*a[j] over i < j
+            S2 = 2*n + (binomial(r+5,2) - (r+5)*sa + sa ** 2 - cross) * HS2 + (r+5-sa) * KSHS + KS2 - c2TS
             self.__lattice_intersection_Matrix = matrix([[self.degree(),HS2],[HS2,S2]])
             return self.__lattice_intersection_Matrix
 
@@ -2731,7 +3158,11 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                 if verbose:
                     print("-- function discriminant(GM fourfold) has successfully terminated. --")
                 return self._discriminant_of_GM_fourfold
-        return(self._lattice_intersection_matrix(verbose=verbose).determinant())
+        try:
+            return self._discriminant_from_lattice
+        except AttributeError:
+            self._discriminant_from_lattice = self._lattice_intersection_matrix(verbose=verbose).determinant()
+            return self._discriminant_from_lattice
 
     def _macaulay2_init_(self, macaulay2=None):
         r"""Get the corresponding special fourfold in Macaulay2."""
@@ -2748,46 +3179,56 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             self._macaulay2_object._sage_object = self
             return self._macaulay2_object
 
+    def _m2_handle(self):
+        r"""Return the fourfold ``self`` in Macaulay2 (for internal use only).
+
+        The returned object is bound to a Macaulay2 variable of its own, whose name is given by its method ``name()``;
+        unlike a shared variable such as ``X``, this is not reassigned by the conversion of other varieties.
+        """
+        return macaulay2(self)
+
     def map_from_fivefold(self, verbose=None, algorithm='sage'):
         r"""(For internal use only) Return the map from the ambient fivefold of ``self``
         defined by the linear system of hypersurfaces containing the surface of ``self`` and
         of degree equal to the degree of ``self`` as a hypersurface in its ambient fivefold.
         """
-        try:
+        # the map is stored before its image is computed: if that computation is interrupted, only the image is computed again
+        phi = self._the_map_from_the_fivefold if hasattr(self,"_the_map_from_the_fivefold") else None
+        if phi is not None and (phi._is_dominant is True or hasattr(phi,"_closure_of_image")):
+            return phi
+        if verbose is None:
+            verbose = __VERBOSE__
+        if algorithm == 'macaulay2':
+            if verbose:
+                print("--computing map_from_fivefold using Macaulay2...")
+            X = macaulay2(self)
+            f = X.map()
+            if verbose:
+                print("--computing image of map_from_fivefold using Macaulay2...")
+            # X.recognize()
+            X.imageOfAssociatedMap()
+            if verbose:
+                print("--computation of image of map_from_fivefold terminated.")
+            self._the_map_from_the_fivefold = _from_macaulay2map_to_sagemap(f.removeUnderscores().multirationalMap(), Sage_Source=self.ambient_fivefold())
+            assert(hasattr(self._the_map_from_the_fivefold,"_closure_of_image"))
             return self._the_map_from_the_fivefold
-        except AttributeError:
-            if verbose is None:
-                verbose = __VERBOSE__
-            if algorithm == 'macaulay2':
-                if verbose:
-                    print("--computing map_from_fivefold using Macaulay2...")
-                X = macaulay2(self)
-                f = X.map()
-                if verbose:
-                    print("--computing image of map_from_fivefold using Macaulay2...")
-                # X.recognize()
-                X.imageOfAssociatedMap()
-                if verbose:
-                    print("--computation of image of map_from_fivefold terminated.")
-                self._the_map_from_the_fivefold = _from_macaulay2map_to_sagemap(f.removeUnderscores().multirationalMap(), Sage_Source=self.ambient_fivefold())
-                assert(hasattr(self._the_map_from_the_fivefold,"_closure_of_image"))
-                return self._the_map_from_the_fivefold
-            if algorithm == 'sage':
+        if algorithm == 'sage':
+            if phi is None:
                 # This needs to be improved!
                 I = ideal(self.surface()._homogeneous_component(self._degree_as_hypersurface))
                 if self.ambient_fivefold().codimension() > 1:
                     I = I.change_ring(self.ambient_fivefold().coordinate_ring())
                 phi = rational_map(self.ambient_fivefold(), I.gens())
-                if verbose:
-                    print("--computing image of map_from_fivefold (using sage)...")
-                phi.image()
-                if verbose:
-                    print("--computation of image of map_from_fivefold terminated.")
                 self._the_map_from_the_fivefold = phi
-                return self._the_map_from_the_fivefold
-            raise ValueError("keyword algorithm must be 'macaulay2' or 'sage'")
+            if verbose:
+                print("--computing image of map_from_fivefold (using sage)...")
+            phi.image()
+            if verbose:
+                print("--computation of image of map_from_fivefold terminated.")
+            return phi
+        raise ValueError("keyword algorithm must be 'macaulay2' or 'sage'")
 
-    def congruence(self, degree=None, num_checks=3, point=None, verbose=None, algorithm_for_image='sage', algorithm_for_point='sage', macaulay2_detectCongruence=False):
+    def congruence(self, degree=None, num_checks=3, point=None, verbose=None, algorithm_for_image='sage', algorithm_for_point='sage', macaulay2_detectCongruence=False, parallel=False):
         r"""Detect and return a congruence of secant curves for the surface of ``self`` in the ambient fivefold of ``self``.
 
         This function works similar to the ``Macaulay2`` function ``detectCongruence``, documented at
@@ -2811,6 +3252,8 @@ class Hodge_special_fourfold(Embedded_projective_variety):
 
         ``macaulay2_detectCongruence`` -- a boolean value, default value false, with ``macaulay2_detectCongruence=True`` the whole computation is performed using the ``Macaulay2`` function ``detectCongruence``.
 
+        ``parallel`` -- a boolean value, default value false, with ``parallel=True`` the inverse images of the lines through a point are computed in parallel by forked processes.
+
         OUTPUT:
 
         A congruence of curves, which behaves like a function that sends a point ``p`` on the ambient fivefold
@@ -2860,14 +3303,23 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             verbose = __VERBOSE__
         f = self.map_from_fivefold(verbose=verbose, algorithm=algorithm_for_image)
 
+        # loop-invariant data of the closure below
+        deg_hyp = self._degree_as_hypersurface
+        S = self.surface()
+        ambient5 = self.ambient_fivefold()
+
         def dim_and_degree(X):
             return(X.dimension(), X.degree())
 
+        def is_finite_of_degree(X, d):
+            # the degree is computed only if X has dimension 0
+            return X.dimension() == 0 and X.degree() == d
+
         def function_congruence(p, degree=None, verbose=false):
             if degree is None and hasattr(self,"_possible_degrees_for_curves_of_congruence") and len(self._possible_degrees_for_curves_of_congruence) == 0:
                 raise RuntimeError("function 'congruence' failed (with previous runs)")
             p = _check_type_embedded_projective_variety(p)
-            if not (p._is_point() and p.is_subset(self.ambient_fivefold())):
+            if not (p._is_point() and p.is_subset(ambient5)):
                 raise ValueError("expected a point on the ambient fivefold")
             q = f(p)
             if verbose:
@@ -2881,7 +3333,16 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                 raise RuntimeError("function 'congruence' failed")
             if verbose:
                 print("--computing inverse images of lines...")
-            curves = [f.inverse_image(q.linear_span()) for q in D]
+            if parallel and len(D) > 1:
+                # Singular is not thread-safe: the inverse images are computed in forked processes, and only their equations are sent back
+                from sage.parallel.decorate import parallel as sage_parallel
+                E = dict([(a[0][0], polys) for (a, polys) in sage_parallel(p_iter='fork')(lambda k: f.inverse_image(D[k].linear_span()).defining_polynomials())(list(range(len(D))))])
+                # a forked process which fails returns a string instead of a list of polynomials
+                if not all(isinstance(E.get(k),(tuple,list)) for k in range(len(D))):
+                    raise RuntimeError("parallel computation of inverse images of lines failed")
+                curves = [Embedded_projective_variety(f.source().ambient_space(), E[k]) for k in range(len(D))]
+            else:
+                curves = [f.inverse_image(q.linear_span()) for q in D]
             if verbose:
                 print("--analyzing " + str(len(curves)) + " curve(s) in the ambient fivefold...")
             degs = [C.degree() for C in curves] if degree is None else [degree]
@@ -2889,21 +3350,22 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                 degs = list(set(degs).intersection(self._possible_degrees_for_curves_of_congruence))
                 if len(degs) == 0:
                     raise RuntimeError("function 'congruence' failed (with previous runs)")
+            dd = [dim_and_degree(C) for C in curves]
             W = []
             for d in degs:
-                E = [C for C in curves if dim_and_degree(C) == (1,d) and dim_and_degree(C.intersection(self.surface())) == (0, d * self._degree_as_hypersurface - 1)]
+                E = [C for (C, c) in zip(curves, dd) if c == (1,d) and is_finite_of_degree(C.intersection(S), d * deg_hyp - 1)]
                 if len(E) == 1:
                     W.extend(E)
             if degree is None and len(W) > 1:
                 if not hasattr(self,"_possible_degrees_for_curves_of_congruence"):
                     self._possible_degrees_for_curves_of_congruence = set([w.degree() for w in W])
                 else:
-                    self._possible_degrees_for_curves_of_congruence = self._possible_degrees_for_curves_of_congruence.intersection(set([w.degree() for w in W]))
+                    self._possible_degrees_for_curves_of_congruence.intersection_update([w.degree() for w in W])
                     if len(self._possible_degrees_for_curves_of_congruence) == 0:
                         raise RuntimeError("function 'congruence' failed (with previous runs)")
                 if verbose:
                     print("found possible degrees for curves of congruences: " + str(self._possible_degrees_for_curves_of_congruence) + ", rerunning the computation using another point...")
-                return function_congruence(self.ambient_fivefold().point(verbose=verbose, algorithm=algorithm_for_point), degree=None, verbose=verbose)
+                return function_congruence(ambient5.point(verbose=verbose, algorithm=algorithm_for_point), degree=None, verbose=verbose)
             if len(W) == 0:
                 raise RuntimeError("function 'congruence' failed")
                 self._possible_degrees_for_curves_of_congruence = set()
@@ -2911,7 +3373,7 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             self._possible_degrees_for_curves_of_congruence = set([w.degree() for w in W])
             return W[0]
 
-        p = self.ambient_fivefold().point(verbose=verbose, algorithm=algorithm_for_point) if point is None else point
+        p = ambient5.point(verbose=verbose, algorithm=algorithm_for_point) if point is None else point
         try:
             Curve = function_congruence(p, degree=degree, verbose=verbose)
         except Exception as err:
@@ -2945,6 +3407,10 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             source: PP^5
             target: PP^4
         """
+        try:
+            return self._cached_fano_map
+        except AttributeError:
+            pass
         if verbose is None:
             verbose = __VERBOSE__
         X = macaulay2(self)
@@ -2955,6 +3421,7 @@ class Hodge_special_fourfold(Embedded_projective_variety):
         except Exception as err:
             raise RuntimeError(err)
         F = _from_macaulay2map_to_sagemap(f, Sage_Source=self.ambient_fivefold())
+        self._cached_fano_map = F
         if verbose:
             print("-- function fanoMap() has successfully terminated. --")
         return F
@@ -2977,7 +3444,7 @@ class Hodge_special_fourfold(Embedded_projective_variety):
             x1^2 - x0*x3)
             sage: Y = X.random_coordinate_change(); Y
             Cubic fourfold of discriminant 20 = 3*12-4^2 containing a surface in PP^5 of degree 4 and sectional genus 0 cut out by 6 hypersurfaces of degree 2
-            sage: Y.surface().defining_polynomials()
+            sage: Y.surface().defining_polynomials()     # random
             (x2^2 - 28*x0*x3 + 31*x1*x3 + 15*x2*x3 + 32*x3^2 + 9*x0*x4 - 34*x1*x4 + 33*x2*x4 + 37*x3*x4 - x4^2 - 18*x0*x5 - 37*x1*x5 + 32*x2*x5 - 22*x3*x5 + x4*x5 + 20*x5^2,
             x1*x2 - 46*x0*x3 + 15*x1*x3 + 28*x2*x3 - 13*x3^2 - 32*x0*x4 - 44*x1*x4 + 27*x2*x4 + 19*x3*x4 - 29*x4^2 + 28*x0*x5 + 48*x1*x5 - 10*x2*x5 - 48*x3*x5 - 33*x4*x5 + 6*x5^2,
             x0*x2 + 6*x0*x3 - 9*x1*x3 - 47*x2*x3 + 34*x3^2 + 40*x0*x4 + 15*x1*x4 + 39*x2*x4 + 17*x3*x4 + 23*x4^2 - x0*x5 + 43*x1*x5 - 38*x2*x5 + 8*x3*x5 - 46*x4*x5 + 49*x5^2,
@@ -2987,8 +3454,14 @@ class Hodge_special_fourfold(Embedded_projective_variety):
 
         """
         V = self.ambient_fivefold().random_coordinate_change()
-        S = V._from_random_coordinate_change(self.surface())
-        X = V._from_random_coordinate_change(self)
+        # the coordinate change is linear, so the images of the surface and of the fourfold are obtained
+        # by substituting the same linear forms in their equations, with no elimination
+        phi = V._random_coordinate_change_ring_map
+        S = Embedded_projective_variety(V.ambient_space(), phi(self.surface().defining_ideal()).gens())
+        X = Embedded_projective_variety(V.ambient_space(), phi(self.defining_ideal()).gens())
+        if __VALIDATE__:
+            f = V._from_random_coordinate_change
+            assert(S == f(self.surface()) and X == f(self))
         return fourfold(S,X,V,check=False)
 
     def parameter_count(self, verbose=None):
@@ -3050,9 +3523,9 @@ class Hodge_special_fourfold(Embedded_projective_variety):
         except AttributeError:
             if verbose:
                 print("-- running Macaulay2 function parameterCount()... --")
-            X = macaulay2(self,'X')
+            X = self._m2_handle()
             if verbose:
-                _print_partial_M2_output("parameterCount(X,Verbose=>true);")
+                _print_partial_M2_output("parameterCount(" + X.name() + ",Verbose=>true);")
             self._macaulay2_parameter_count = X.parameterCount().sage()
             if verbose:
                 print("-- function parameterCount() has terminated. --")
@@ -3071,21 +3544,37 @@ class Hodge_special_fourfold(Embedded_projective_variety):
         except AttributeError:
             if verbose:
                 print("-- running Macaulay2 function " + s + "()... --")
-            X = macaulay2(self,'X')
+            X = self._m2_handle()
             if verbose:
-                _print_partial_M2_output(s + "(X,Verbose=>true);")
+                _print_partial_M2_output(s + "(" + X.name() + ",Verbose=>true);")
             U = X.associatedK3surface() if not isinstance(self,_Intersection_of_three_quadrics_in_P7) else X.associatedCastelnuovoSurface()
-            mu = _from_macaulay2map_to_sagemap(U.building()[0].removeUnderscores(),Sage_Source=self.ambient_fivefold())
-            U_non_minimal = _from_macaulay2_to_sage(U.building()[1].removeUnderscores(),Sage_Ambient_Space=mu.target().ambient_space())
-            L = _from_macaulay2_to_sage(U.building()[2][0].removeUnderscores(),Sage_Ambient_Space=mu.target().ambient_space())
-            C = _from_macaulay2_to_sage(U.building()[2][1].removeUnderscores(),Sage_Ambient_Space=mu.target().ambient_space())
-            f = _from_macaulay2map_to_sagemap(U.building()[3].removeUnderscores(),Sage_Source=U_non_minimal)
-            assert(mu.source() is self.ambient_fivefold() and U_non_minimal.is_subset(mu.target()) and L.is_subset(U_non_minimal) and C.is_subset(U_non_minimal) and f.source() is U_non_minimal and f.image().dimension() == 2)
+            # the five pieces of the building are flattened and cleaned in a single Macaulay2 call
+            b = macaulay2('b -> apply({b#0, b#1, b#2#0, b#2#1, b#3}, removeUnderscores)')(U.building())
+            mu = _from_macaulay2map_to_sagemap(b[0],Sage_Source=self.ambient_fivefold())
+            A = mu.target().ambient_space()
+            U_non_minimal = _from_macaulay2_to_sage(b[1],Sage_Ambient_Space=A)
+            L = _from_macaulay2_to_sage(b[2],Sage_Ambient_Space=A)
+            C = _from_macaulay2_to_sage(b[3],Sage_Ambient_Space=A)
+            f = _from_macaulay2map_to_sagemap(b[4],Sage_Source=U_non_minimal)
+            assert(mu.source() is self.ambient_fivefold() and f.source() is U_non_minimal)
+            if __VALIDATE__:
+                assert(U_non_minimal.is_subset(mu.target()) and L.is_subset(U_non_minimal) and C.is_subset(U_non_minimal) and f.image().dimension() == 2)
             self._macaulay2_associated_surface_construction = (mu, U_non_minimal, (L,C), f)
             if verbose:
                 print("-- function " + s + "() has terminated. --")
             return self._macaulay2_associated_surface_construction
 
+    def _associated_surface(self, verbose=None):
+        r"""Return the surface constructed by :meth:`_associated_surface_construction`, with the attribute ``building`` attached (for internal use only)."""
+        try:
+            return self._cached_associated_surface_image
+        except AttributeError:
+            building = self._associated_surface_construction(verbose=verbose)
+            T = building[3].image()
+            T.building = lambda : building
+            self._cached_associated_surface_image = T
+            return T
+
     def _detect_congruence_using_macaulay2(self, Degree=None, verbose=None):
         r"""Detect and return a congruence of secant curves using ``Macaulay2``."""
         try:
@@ -3095,10 +3584,13 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                 verbose = __VERBOSE__
             if verbose:
                 print("-- running Macaulay2 function detectCongruence()... --")
-            X = macaulay2(self,'X')
-            X.recognize() # this can speed up the computation
+            X = self._m2_handle()
+            # recognize() is run once per Macaulay2 session
+            if getattr(self, "_m2_recognized", None) != macaulay2._session_number:
+                X.recognize() # this can speed up the computation
+                self._m2_recognized = macaulay2._session_number
             if verbose:
-                m2_str = "CONGRUENCE = detectCongruence(X,Verbose=>true);" if Degree is None else "CONGRUENCE = detectCongruence(X," + str(Degree) + ",Verbose=>true);"
+                m2_str = "CONGRUENCE = detectCongruence(" + X.name() + ",Verbose=>true);" if Degree is None else "CONGRUENCE = detectCongruence(" + X.name() + "," + str(Degree) + ",Verbose=>true);"
                 _print_partial_M2_output(m2_str)
                 f = macaulay2('CONGRUENCE')
             else:
@@ -3111,7 +3603,8 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                     raise ValueError("expected a point on the ambient fivefold")
                 C = f(p)
                 D = _from_macaulay2_to_sage(C,self.ambient_space())
-                assert(p.is_subset(D) and D.is_subset(self.ambient_fivefold()) and D.dimension() == 1 and D.degree() == deg_congr)
+                if __VALIDATE__:
+                    assert(p.is_subset(D) and D.is_subset(self.ambient_fivefold()) and D.dimension() == 1 and D.degree() == deg_congr)
                 return D
 
             g = _Congruence_of_secant_curves_to_surface(f_s, f, deg_congr, self)
@@ -3121,6 +3614,8 @@ class Hodge_special_fourfold(Embedded_projective_variety):
                 print("-- function detectCongruence() has terminated. --")
             return g
 
+_CURVES_WORD = (None, "lines", "conics", "cubic curves", "quartic curves", "quintic curves", "sextic curves", "septic curves", "octic curves", "nonic curves")
+
 class _Congruence_of_secant_curves_to_surface(SageObject):
     r"""The class of objects created by the function :meth:`congruence`."""
     def __init__(self, f_s, f, deg_congr, X):
@@ -3129,20 +3624,9 @@ class _Congruence_of_secant_curves_to_surface(SageObject):
         self._degree = deg_congr
         self._fourfold = X
     def _repr_(self):
-        curves_word = {
-            1:"lines",
-            2:"conics",
-            3:"cubic curves",
-            4:"quartic curves",
-            5:"quintic curves",
-            6:"sextic curves",
-            7:"septic curves",
-            8:"octic curves",
-            9:"nonic curves"
-        }
         d = self._degree
         a = self._fourfold._degree_as_hypersurface
-        return "Congruence of " + str(a*d - 1) + "-secant " + (curves_word[d] if d <= 9 else "curves of degree " + str(d)) + "\nto: " + self._fourfold.surface()._repr_() + "\nin: " + self._fourfold.ambient_fivefold()._repr_()
+        return "Congruence of " + str(a*d - 1) + "-secant " + (_CURVES_WORD[d] if d <= 9 else "curves of degree " + str(d)) + "\nto: " + self._fourfold.surface()._repr_() + "\nin: " + self._fourfold.ambient_fivefold()._repr_()
     def __call__(self, p):
         return self._function_on_points(p)
     def _macaulay2_init_(self, macaulay2=None):
@@ -3150,12 +3634,24 @@ class _Congruence_of_secant_curves_to_surface(SageObject):
             from sage.interfaces.macaulay2 import macaulay2 as m2_default
             macaulay2 = m2_default
         return self._macaulay2_object
-    def check(self, i=1, verbose=None, algorithm_for_point=None):
+    def check(self, i=1, verbose=None, algorithm_for_point=None, parallel=False):
         if verbose is None:
             verbose = __VERBOSE__
         if algorithm_for_point is None:
             algorithm_for_point = 'sage' if self._macaulay2_object is None else 'macaulay2'
         V = self._fourfold.ambient_fivefold()
+        if parallel and i > 1 and self._macaulay2_object is None and algorithm_for_point == 'sage':
+            # the checks are independent: they are run in forked processes, each one with its own random point
+            # (this is not done for congruences computed by Macaulay2, whose session is not shared with forked processes)
+            if verbose:
+                print("-- checking congruence (" + str(i) + " points in parallel)...")
+            from sage.parallel.decorate import parallel as sage_parallel
+            def check_at_random_point(j):
+                self(V.point(verbose=False, algorithm=algorithm_for_point))
+                return True
+            if any(r is not True for (a, r) in sage_parallel(p_iter='fork', reseed_rng=True)(check_at_random_point)(list(range(i)))):
+                raise RuntimeError("congruence check failed")
+            return self
         for j in range(i):
             if verbose:
                 print("-- checking congruence ("+str(j+1)+" of "+str(i)+")...")
@@ -3164,11 +3660,13 @@ class _Congruence_of_secant_curves_to_surface(SageObject):
 
 class _Intersection_of_three_quadrics_in_P7(Hodge_special_fourfold):
     r"""The class of Hodge-special complete intersections of three quadrics in ``PP^7``."""
+    _degree_as_hypersurface = 2
+
     def __init__(self, S, X, V=None, check=True):
         super().__init__(S,X,V,check=check)
-        if not(self.degrees_generators() == (2,2,2) and self.ambient_fivefold().degrees_generators() == (2,2)):
+        # the ambient fivefold is probed only with check=True and if it was passed, since otherwise a random one would be constructed here
+        if self.degrees_generators() != (2,2,2) or (check and V is not None and self.ambient_fivefold().degrees_generators() != (2,2)):
             raise ValueError("something went wrong in constructing complete intersections of three quadrics in PP^7")
-        self._degree_as_hypersurface = 2
 
     def _repr_(self):
         return("Complete intersection of 3 quadrics in PP^7 of discriminant " + str(self.discriminant(verbose=False)) + " = 8*" + str(self._lattice_intersection_matrix()[1,1]) + "-" + str(self._lattice_intersection_matrix()[0,1]) + "^2" + " containing a " + str(self.surface()))
@@ -3196,7 +3694,8 @@ class _Intersection_of_three_quadrics_in_P7(Hodge_special_fourfold):
         try:
             return self._ambient_fivefold
         except AttributeError:
-            print("setting ambient fivefold...")
+            if __VERBOSE__:
+                print("setting ambient fivefold...")
             self._ambient_fivefold = self.random(2,2)
             return self._ambient_fivefold
 
@@ -3218,10 +3717,7 @@ class _Intersection_of_three_quadrics_in_P7(Hodge_special_fourfold):
             target: PP^4
 
         """
-        self._associated_surface_construction(verbose=verbose)
-        T = self._macaulay2_associated_surface_construction[3].image()
-        T.building = lambda : self._macaulay2_associated_surface_construction
-        return T
+        return self._associated_surface(verbose=verbose)
 
 class _Virtual_intersection_of_three_quadrics_in_P7(_Intersection_of_three_quadrics_in_P7):
     r"""The class of virtual Hodge-special complete intersections of three quadrics in ``PP^7``.
@@ -3255,11 +3751,12 @@ class _Virtual_intersection_of_three_quadrics_in_P7(_Intersection_of_three_quadr
 
 class Cubic_fourfold(Hodge_special_fourfold):
     r"""The class of Hodge-special cubic fourfolds in ``PP^5``."""
+    _degree_as_hypersurface = 3
+
     def __init__(self, S, X, V=None, check=True):
         super().__init__(S,X,V,check=check)
         if not(self.degree() == 3 and self.codimension() == 1 and len(self.degrees_generators()) == 1):
             raise ValueError("something went wrong in constructing cubic fourfold in PP^5")
-        self._degree_as_hypersurface = 3
 
     def _repr_(self):
         return("Cubic fourfold of discriminant " + str(self.discriminant(verbose=False)) + " = 3*" + str(self._lattice_intersection_matrix()[1,1]) + "-" + str(self._lattice_intersection_matrix()[0,1]) + "^2" + " containing a " + str(self.surface()))
@@ -3308,10 +3805,7 @@ class Cubic_fourfold(Hodge_special_fourfold):
             target: quadric hypersurface in PP^5
 
         """
-        self._associated_surface_construction(verbose=verbose)
-        T = self._macaulay2_associated_surface_construction[3].image()
-        T.building = lambda : self._macaulay2_associated_surface_construction
-        return T
+        return self._associated_surface(verbose=verbose)
 
 class _Virtual_cubic_fourfold(Cubic_fourfold):
     r"""The class of virtual Hodge-special cubic fourfolds in ``PP^5``.
@@ -3340,6 +3834,10 @@ class _Virtual_cubic_fourfold(Cubic_fourfold):
     def K3(self, verbose=None):
         raise NotImplementedError
 
+# the marks distinguishing the two families of GM fourfolds of discriminant d = 2 mod 8,
+# indexed by the parities of a+b and b, where (a,b) is the class of the surface in GG(1,4)
+_GM_PARITY_SUFFIX = {(0,1): "(')", (1,0): "('')"}
+
 class GushelMukai_fourfold(Hodge_special_fourfold):
     r"""The class of Hodge-special Gushel-Mukai fourfolds in ``PP^8``
 
@@ -3350,24 +3848,28 @@ class GushelMukai_fourfold(Hodge_special_fourfold):
         sage: assert(X.base_ring().characteristic() == 33331)   # optional - macaulay2
 
     """
+    _degree_as_hypersurface = 2
+
     def __init__(self, S, X, V=None, check=True):
         super().__init__(S,X,V,check=check)
         if not(self.ambient().dimension() == 8 and self.degrees_generators() == (2,2,2,2,2,2) and self.degree() == 10 and self.sectional_genus() == 6):
             raise ValueError("something went wrong in constructing Gushel-Mukai fourfold in PP^8")
-        self._degree_as_hypersurface = 2
 
     def _repr_(self):
-        d = self.discriminant(verbose=False)
-        (a,b) = self._class_of_surface_in_the_Grass
-        e = ""
-        if d % 8 == 2:
-            if (a+b) % 2 == 0 and b % 2 == 1:
-                e = "(')"
-            elif (a+b) % 2 == 1 and b % 2 == 0:
-                e = "('')"
-            else:
-                raise RuntimeError("Internal error encountered.")
-        return("Gushel-Mukai fourfold of discriminant " + str(d) + e + " containing a " + str(self.surface()) + ", class of the surface in GG(1,4): " + str((a,b)))
+        # only the discriminant is cached here: the description of the surface is rendered on each call, since the surface may
+        # add data computed later (e.g. the number of nodes of a rational surface) to the part stored by _expr_var_1
+        try:
+            label = self._discriminant_label
+        except AttributeError:
+            d = self.discriminant(verbose=False)
+            (a,b) = self._class_of_surface_in_the_Grass
+            e = ""
+            if d % 8 == 2:
+                e = _GM_PARITY_SUFFIX.get(((a+b) % 2, b % 2))
+                if e is None:
+                    raise RuntimeError("Internal error encountered.")
+            label = self._discriminant_label = str(d) + e
+        return("Gushel-Mukai fourfold of discriminant " + label + " containing a " + str(self.surface()) + ", class of the surface in GG(1,4): " + str(self._class_of_surface_in_the_Grass))
 
     def _latex_(self):
         r"""Return the LaTeX representation of the Gushel-Mukai fourfold."""
@@ -3399,10 +3901,9 @@ class GushelMukai_fourfold(Hodge_special_fourfold):
             target: quadric hypersurface in PP^5
 
         """
-        self._associated_surface_construction(verbose=verbose)
-        T = self._macaulay2_associated_surface_construction[3].image()
-        T.building = lambda : self._macaulay2_associated_surface_construction
-        return T
+        return self._associated_surface(verbose=verbose)
+
+_VIRTUAL_FOURFOLD_BY_AMBIENT_DIM = {5: _Virtual_cubic_fourfold, 7: _Virtual_intersection_of_three_quadrics_in_P7}
 
 def fourfold(S, X=None, V=None, check=True):
     r"""Construct Hodge-special fourfolds.
@@ -3469,22 +3970,22 @@ def fourfold(S, X=None, V=None, check=True):
         if not(V is None and check is True and (X is None or isinstance(X,(int,Integer)) or X in Fields())):
             raise TypeError
         return _special_fourfold_from_m2(S, i=X)
-    if isinstance(S,sage.interfaces.abc.Macaulay2Element) and S.instance(macaulay2('HodgeSpecialFourfold')).sage():
+    if isinstance(S,_Virtual_projective_surface):
+        if X is not None or V is not None:
+            raise TypeError("fourfold and ambient fivefold don't have to be passed along with a virtual surface")
+        n = S.ambient().dimension()
+        if n in _VIRTUAL_FOURFOLD_BY_AMBIENT_DIM:
+            return _VIRTUAL_FOURFOLD_BY_AMBIENT_DIM[n](S, check=check)
+        raise NotImplementedError("Hodge-special fourfold containing a virtual surface in PP^" + str(n))
+    # the Macaulay2 test is performed only on Macaulay2 objects, and after the cheaper tests
+    if isinstance(S,sage.interfaces.abc.Macaulay2Element) and S.sageTypeCode().sage() == 2:
         if not(X is None and V is None and check is True):
             raise TypeError
         Z = S.removeUnderscores()
-        A = ProjectiveSpace(Z.ambient().ring().sage())
+        A = _projective_space_of_macaulay2_ring(Z.ambient().ring())
         F = _from_macaulay2_to_sage(Z,A)
         F._macaulay2_object = S
         return F
-    if isinstance(S,_Virtual_projective_surface):
-        if X is not None or V is not None:
-            raise TypeError("fourfold and ambient fivefold don't have to be passed along with a virtual surface")
-        if S.ambient().dimension() == 5:
-            return _Virtual_cubic_fourfold(S, check=check)
-        if S.ambient().dimension() == 7:
-            return _Virtual_intersection_of_three_quadrics_in_P7(S, check=check)
-        raise NotImplementedError("Hodge-special fourfold containing a virtual surface in PP^" + str(S.ambient().dimension()))
     S = _check_type_embedded_projective_variety(S)
     if X is not None:
         X = _check_type_embedded_projective_variety(X)
@@ -3517,34 +4018,71 @@ def _special_fourfold_from_m2(s, i=None):
         raise TypeError("expected an integer or a field")
     t = ')' if i is None else ', ' + str(i) + ')' if isinstance(i,(int,Integer)) else ', ' + macaulay2(i).toExternalString().sage() + ')'
     XinM2 = macaulay2('specialFourfold("' + s + '"' + t).removeUnderscores()
-    V = ProjectiveSpace(XinM2.ambient().ring().sage())
+    V = _projective_space_of_macaulay2_ring(XinM2.ambient().ring())
     return(_from_macaulay2_to_sage(XinM2,V))
 
+_macaulay2_rings_to_projective_spaces = OrderedDict()
+
+def _projective_space_of_macaulay2_ring(R, max_size=64):
+    r"""Return the projective space with coordinate ring the ``Macaulay2`` polynomial ring ``R``.
+
+    The translation of the ring into Sage is cached by the external string of ``R`` (for internal use only).
+    """
+    key = str(R.toExternalString())
+    try:
+        A = _macaulay2_rings_to_projective_spaces[key]
+        _macaulay2_rings_to_projective_spaces.move_to_end(key)
+        return A
+    except KeyError:
+        A = ProjectiveSpace(R.sage())
+        _macaulay2_rings_to_projective_spaces[key] = A
+        if len(_macaulay2_rings_to_projective_spaces) > max_size:
+            _macaulay2_rings_to_projective_spaces.popitem(last=False)
+        return A
+
+# names of curves and surfaces determined by dimension and degree (lines and planes must be cut out by linear forms, conics must have genus 0)
+_LOW_DIMENSIONAL_NAMES = {(1,1): "line", (1,2): "conic curve", (2,1): "plane", (2,2): "quadric surface"}
+# names of hypersurfaces of low degree
+_HYPERSURFACE_NAMES = {1: "hyperplane", 2: "quadric hypersurface", 3: "cubic hypersurface"}
+
 def _expr_var_0(Dim, DimAmbient):
     if DimAmbient < 0:
         return("empty scheme", "\\mbox{empty scheme}")
     if Dim < 0 and DimAmbient < 1:
         return("empty scheme", "\\mbox{empty scheme}") # provisional
+    sn = str(DimAmbient)
+    PP_l = "\\mathbb{P}^{" + latex(DimAmbient) + "}"
     if Dim < 0:
-        return("empty subscheme of PP^" + str(DimAmbient), "\\mbox{empty subscheme of }\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("empty subscheme of PP^" + sn, "\\mbox{empty subscheme of }" + PP_l)
     if Dim == DimAmbient:
-        return("PP^" + str(DimAmbient), "\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("PP^" + sn, PP_l)
     if Dim == 1:
-        return("curve in PP^" + str(DimAmbient), "\\mbox{curve in }" + "\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("curve in PP^" + sn, "\\mbox{curve in }" + PP_l)
     if Dim == 2:
-        return("surface in PP^" + str(DimAmbient), "\\mbox{surface in }" + "\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("surface in PP^" + sn, "\\mbox{surface in }" + PP_l)
     if DimAmbient - Dim == 1:
-        return("hypersurface in PP^" + str(DimAmbient), "\\mbox{hypersurface in }" + "\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("hypersurface in PP^" + sn, "\\mbox{hypersurface in }" + PP_l)
     if Dim == 3:
-        return("threefold in PP^" + str(DimAmbient), "\\mbox{threefold in }" + "\\mathbb{P}^{" + latex(DimAmbient) + "}")
-    return(str(Dim) + "-dimensional subvariety of PP^" + str(DimAmbient), latex(Dim) + "\\mbox{-dimensional subvariety of }" + "\\mathbb{P}^{" + latex(DimAmbient) + "}")
+        return("threefold in PP^" + sn, "\\mbox{threefold in }" + PP_l)
+    return(str(Dim) + "-dimensional subvariety of PP^" + sn, latex(Dim) + "\\mbox{-dimensional subvariety of }" + PP_l)
 
 def _expr_var_1(X):
+    # the description depends only on invariants determined by the equations of X (dimension, degree, degrees of the generators,
+    # sectional genus, coordinates of a point), so it is stored on X; data which may be computed later, such as the number of nodes
+    # of a rational surface, are added by the _repr_ methods of subclasses and are not stored
+    try:
+        return X._expr_var_1
+    except AttributeError:
+        e = _expr_var_1_uncached(X)
+        if isinstance(X, Embedded_projective_variety):
+            X._expr_var_1 = e
+        return e
+
+def _expr_var_1_uncached(X):
     k = X.dimension()
     n = X.ambient().dimension()
     if k < 0 or k >= n:
         return _expr_var_0(k,n)
-    degs = X.degrees_generators()
     if k == 0:
         if X._is_point():
             c = " of coordinates " + str(X._coordinates())
@@ -3552,50 +4090,161 @@ def _expr_var_1(X):
             return("one-point scheme in PP^" + str(n) + c, "\\mbox{one-point scheme in }" + "\\mathbb{P}^{" + latex(n) + "}" + c_l)
         else:
             return("0-dimensional subscheme of degree " + str(X.degree()) + " in PP^" + str(n), latex(0) + "\\mbox{-dimensional subscheme of degree }" + latex(X.degree())  + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}")
+    # the degrees of the generators are not needed for 0-dimensional schemes
+    degs = X.degrees_generators()
+    # the pieces shared by several descriptions are computed once
+    d = X.degree()
+    sn = str(n)
+    PP_l = "\\mathbb{P}^{" + latex(n) + "}"
+    n_degs = len(degs)
+    all_linear = degs.count(1) == n_degs
+    name = _LOW_DIMENSIONAL_NAMES.get((k, d))
+    if name is not None and (d != 1 or all_linear) and (k != 1 or d != 2 or X.sectional_genus() == 0):
+        return(name + " in PP^" + sn, "\\mbox{" + name + " in }" + PP_l)
     cutOut = ""
-    if len(degs) > 1:
-        if degs.count(degs[0]) == len(degs):
-            cutOut = " cut out by " + str(len(degs)) + " hypersurfaces of degree " + str(degs[0])
-        else:
-            cutOut = " cut out by " + str(len(degs)) + " hypersurfaces of degrees " + str(tuple(degs))
     cutOut_l = ""
-    if len(degs) > 1:
-        if degs.count(degs[0]) == len(degs):
-            cutOut_l = "\\mbox{ cut out by }" + latex(len(degs)) + "\\mbox{ hypersurfaces of degree }" + latex(degs[0])
+    if n_degs > 1:
+        if degs.count(degs[0]) == n_degs:
+            cutOut = " cut out by " + str(n_degs) + " hypersurfaces of degree " + str(degs[0])
+            cutOut_l = "\\mbox{ cut out by }" + latex(n_degs) + "\\mbox{ hypersurfaces of degree }" + latex(degs[0])
         else:
-            cutOut_l = "\\mbox{ cut out by }" + latex(len(degs)) + "\\mbox{ hypersurfaces of degrees }" + latex(tuple(degs))
+            cutOut = " cut out by " + str(n_degs) + " hypersurfaces of degrees " + str(tuple(degs))
+            cutOut_l = "\\mbox{ cut out by }" + latex(n_degs) + "\\mbox{ hypersurfaces of degrees }" + latex(tuple(degs))
     if k == 1:
-        if degs.count(1) == len(degs) and X.degree() == 1:
-            return("line in PP^" + str(n), "\\mbox{line in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if X.degree() == 2 and X.sectional_genus() == 0:
-            return("conic curve in PP^" + str(n), "\\mbox{conic curve in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if X.degree() == 3:
-            return("cubic curve of arithmetic genus " + str(X.sectional_genus()) + " in PP^" + str(n) + cutOut, "\\mbox{cubic curve of arithmetic genus }" + latex(X.sectional_genus()) + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}" + cutOut_l)
-        return("curve of degree " + str(X.degree()) + " and arithmetic genus " + str(X.sectional_genus()) + " in PP^" + str(n) + cutOut, "\\mbox{curve of degree }" + latex(X.degree()) + "\\mbox{ and arithmetic genus }" + latex(X.sectional_genus()) + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}" + cutOut_l)
+        if d == 3:
+            return("cubic curve of arithmetic genus " + str(X.sectional_genus()) + " in PP^" + sn + cutOut, "\\mbox{cubic curve of arithmetic genus }" + latex(X.sectional_genus()) + "\\mbox{ in }" + PP_l + cutOut_l)
+        return("curve of degree " + str(d) + " and arithmetic genus " + str(X.sectional_genus()) + " in PP^" + sn + cutOut, "\\mbox{curve of degree }" + latex(d) + "\\mbox{ and arithmetic genus }" + latex(X.sectional_genus()) + "\\mbox{ in }" + PP_l + cutOut_l)
     if k == 2:
-        if degs.count(1) == len(degs) and X.degree() == 1:
-            return("plane in PP^" + str(n), "\\mbox{plane in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if X.degree() == 2:
-            return("quadric surface in PP^" + str(n), "\\mbox{quadric surface in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if X.degree() == 3:
-            return("cubic surface in PP^" + str(n) + cutOut, "\\mbox{cubic surface in }" + "\\mathbb{P}^{" + latex(n) + "}" + cutOut_l)
-        return("surface in PP^" + str(n) + " of degree " + str(X.degree()) + " and sectional genus " + str(X.sectional_genus()) + cutOut, "\\mbox{surface in }\\mathbb{P}^{" + latex(n) + "}" + "\\mbox{ of degree }" + latex(X.degree()) + "\\mbox{ and sectional genus }" + latex(X.sectional_genus()) + cutOut_l)
-    if len(degs) == 1 and n - k == 1 and degs[0] == X.degree():
-        if degs[0] == 1:
-            return("hyperplane in PP^" + str(n), "\\mbox{hyperplane in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if degs[0] == 2:
-            return("quadric hypersurface in PP^" + str(n), "\\mbox{quadric hypersurface in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        if degs[0] == 3:
-            return("cubic hypersurface in PP^" + str(n), "\\mbox{cubic hypersurface in }" + "\\mathbb{P}^{" + latex(n) + "}")
-        return("hypersurface of degree " + str(X.degree()) + " in PP^" + str(n), "\\mbox{hypersurface of degree }" + latex(X.degree()) + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}")
-    if len(degs) == n - k and X.degree() == product(degs):
-        if degs.count(1) == len(degs):
-            return("linear " + str(k) + "-dimensional subspace of PP^" + str(n),   "\\mbox{linear }" + latex(X.dimension()) + "\\mbox{-dimensional subspace of }\\mathbb{P}^{" + latex(n) + "}")
-        return("complete intersection of type " + str(tuple(degs)) + " in PP^" + str(n), "\\mbox{complete intersection of type }" + latex(tuple(degs)) + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}")
-    return(str(k) + "-dimensional variety of degree " + str(X.degree()) + " in PP^" + str(n) + cutOut, latex(k) + "\\mbox{-dimensional variety of degree }" + latex(X.degree()) + "\\mbox{ in }\\mathbb{P}^{" + latex(n) + "}" + cutOut_l)
-
-def _random1(R):
-    return(sum([R.random_element(degree=0) * x for x in R.gens()]))
+        if d == 3:
+            return("cubic surface in PP^" + sn + cutOut, "\\mbox{cubic surface in }" + PP_l + cutOut_l)
+        return("surface in PP^" + sn + " of degree " + str(d) + " and sectional genus " + str(X.sectional_genus()) + cutOut, "\\mbox{surface in }" + PP_l + "\\mbox{ of degree }" + latex(d) + "\\mbox{ and sectional genus }" + latex(X.sectional_genus()) + cutOut_l)
+    if n_degs == 1 and n - k == 1 and degs[0] == d:
+        if d in _HYPERSURFACE_NAMES:
+            name = _HYPERSURFACE_NAMES[d]
+            return(name + " in PP^" + sn, "\\mbox{" + name + " in }" + PP_l)
+        return("hypersurface of degree " + str(d) + " in PP^" + sn, "\\mbox{hypersurface of degree }" + latex(d) + "\\mbox{ in }" + PP_l)
+    if n_degs == n - k and d == prod(degs):
+        if all_linear:
+            return("linear " + str(k) + "-dimensional subspace of PP^" + sn,   "\\mbox{linear }" + latex(X.dimension()) + "\\mbox{-dimensional subspace of }" + PP_l)
+        return("complete intersection of type " + str(tuple(degs)) + " in PP^" + sn, "\\mbox{complete intersection of type }" + latex(tuple(degs)) + "\\mbox{ in }" + PP_l)
+    return(str(k) + "-dimensional variety of degree " + str(d) + " in PP^" + sn + cutOut, latex(k) + "\\mbox{-dimensional variety of degree }" + latex(d) + "\\mbox{ in }" + PP_l + cutOut_l)
+
+@cached_function
+def _graph_ring(K, n, m):
+    r"""Return the coordinate ring of ``PP^n x PP^m`` over ``K``, with variables ``x0,...,xn,y0,...,ym`` and a block order eliminating the ``x`` (for internal use only)."""
+    return PolynomialRing(K,n+m+2,['x'+str(i) for i in range(n+1)]+['y'+str(j) for j in range(m+1)], order=TermOrder('degrevlex',n+1)+TermOrder('degrevlex',m+1))
+
+def _modular_groebner_basis(I):
+    r"""Return a Groebner basis of the ideal ``I`` over the rationals, computed modulo several primes and lifted with ``Singular``'s ``modStd``."""
+    from sage.libs.singular.function_factory import ff
+    return ff.modstd__lib.modStd(I)
+
+def _minbase_modular(I, p=32003):
+    r"""Return a minimal set of generators of the homogeneous ideal ``I`` over the rationals.
+
+    A minimal subset of the generators of ``I`` is selected working modulo the prime ``p``, degree by degree:
+    the generators of degree ``d`` are reduced modulo a Groebner basis of the ideal generated by the selected generators of lower degree,
+    and those whose normal forms are linearly independent are selected. It is then checked over the rationals,
+    with a modular Groebner basis, that the subset still generates ``I``.
+    If the check fails (which can only happen for an unlucky prime), ``_minbase(I)`` is returned.
+    """
+    R = I.ring()
+    gens = sorted([g for g in I.gens() if g != 0], key=lambda g: g.degree())
+    Rp = R.change_ring(GF(p))
+    try:
+        gens_p = [Rp(g) for g in gens]
+    except ZeroDivisionError:
+        return _minbase(I)
+    if any(g == 0 for g in gens_p):
+        return _minbase(I)
+    S = []
+    i = 0
+    while i < len(gens):
+        d = gens[i].degree()
+        block = [j for j in range(i, len(gens)) if gens[j].degree() == d]
+        i = block[-1] + 1
+        # one Groebner basis per degree: normal forms are linear, so a generator of degree d is redundant
+        # if and only if its normal form depends linearly on those of the generators of degree d preceding it
+        if len(S) > 0:
+            G = Rp.ideal([gens_p[j] for j in S]).groebner_basis()
+            nf = [gens_p[j].reduce(G) for j in block]
+        else:
+            nf = [gens_p[j] for j in block]
+        monomials = sorted(set([m for f in nf for m in f.monomials()]))
+        if len(monomials) == 0:
+            continue
+        M = matrix(Rp.base_ring(), [[f.monomial_coefficient(m) for m in monomials] for f in nf])
+        S.extend([block[k] for k in M.pivot_rows()])
+    S = [gens[j] for j in S]
+    if len(S) < len(gens):
+        G = _modular_groebner_basis(R.ideal(S))
+        if any(g.reduce(G) != 0 for g in gens):
+            return _minbase(I)
+    return S
+
+def _saturation_by_irrelevant_ideal(I, algorithm=None):
+    r"""Return the saturation of the homogeneous ideal ``I`` with respect to the irrelevant ideal.
+
+    If ``algorithm`` is ``None``, this is ``Singular``'s saturation. Otherwise, after a random linear change of coordinates,
+    a degree reverse lexicographic Groebner basis of ``I`` is computed with ``groebner_basis(algorithm=algorithm)``
+    and each of its elements is divided by the highest power of the last variable dividing it (Bayer-Stillman);
+    this gives the saturation of ``I`` by a general linear form, which coincides with the saturation by the irrelevant ideal.
+    """
+    R = I.ring()
+    if algorithm is None:
+        return I.saturation(R.irrelevant_ideal())[0]
+    if R.term_order().name() != 'degrevlex':
+        raise NotImplementedError("expected a degree reverse lexicographic order")
+    K = R.base_ring()
+    n = R.ngens()
+    A = random_matrix(K, n, n)
+    while not A.is_invertible():
+        A = random_matrix(K, n, n)
+    v = vector(R, R.gens())
+    G = R.ideal([g(*(A * v)) for g in I.gens()]).groebner_basis(algorithm=algorithm)
+    t = R.gens()[-1]
+    H = [g // t**min([e[-1] for e in g.exponents()]) for g in G if g != 0]
+    B = A.inverse() * v
+    return R.ideal([h(*B) for h in H])
+
+def _balanced_reduction(L, op):
+    r"""Return ``op(...op(op(L[0], L[1]), ...)...)`` for a nonempty list ``L``, computed pairwise along a balanced binary tree.
+
+    This is used for intersections of ideals and unions of varieties, so that the intermediate results have comparable size.
+    """
+    while len(L) > 1:
+        L = [op(L[i], L[i+1]) if i+1 < len(L) else L[i] for i in range(0, len(L), 2)]
+    return L[0]
+
+def _random_contraction(B):
+    r"""Return the ideal generated by a random linear combination of the generators of the homogeneous ideal ``B`` if they all have the same degree, ``B`` otherwise (for internal use only)."""
+    if len(set([b.degree() for b in B.gens()])) != 1:
+        return B
+    K = B.ring().base_ring()
+    C = ideal((vector(K, [K.random_element() for b in B.gens()]) * vector(B.ring(), B.gens())))
+    assert(C.is_homogeneous())
+    return C
+
+def _random_linear_forms(R, m):
+    r"""Return a list of ``m`` random linear forms in the polynomial ring ``R``."""
+    return (random_matrix(R.base_ring(), m, R.ngens()) * vector(R, R.gens())).list()
+
+def _linear_coefficient_matrix(polys, R):
+    r"""Return the matrix over the base field of ``R`` whose rows are the coefficients of the linear forms ``polys`` with respect to the variables of ``R``."""
+    return matrix(R.base_ring(), len(polys), R.ngens(), [[g.monomial_coefficient(x) for x in R.gens()] for g in polys])
+
+def _rename_variables(polys, T):
+    r"""Return the polynomials ``polys`` in the polynomial ring ``T``, sending the ``i``-th variable of their ring to the ``i``-th variable of ``T`` (for internal use only)."""
+    R = Sequence(polys).universe()
+    if isinstance(R, MPolynomialRing_base) and R.ngens() == T.ngens():
+        # the exponent vectors are unchanged, so the polynomials are rebuilt from their dictionaries
+        return [T(R(pol).dict()) for pol in polys]
+    if isinstance(R, MPolynomialRing_base) and R.ngens() < T.ngens() and R.base_ring() is T.base_ring():
+        # a single ring homomorphism is applied to all the polynomials
+        phi = R.hom(T.gens()[:R.ngens()], T)
+        return [phi(pol) for pol in polys]
+    s = dict(zip(R.gens(), T.gens()))
+    return [pol.subs(s) for pol in polys]
 
 def _from_macaulay2_to_sage(X, Sage_Ambient_Space):
     r"""Convert varieties and special fourfolds from Macaulay2 to Sage.
@@ -3624,20 +4273,24 @@ def _from_macaulay2_to_sage(X, Sage_Ambient_Space):
     try:
         return X._sage_object
     except AttributeError:
-        if X.instance('HodgeSpecialFourfold').sage():
-            varX = _from_macaulay2_to_sage(X.ring().projectiveVariety(), Sage_Ambient_Space)
-            varS = _from_macaulay2_to_sage(X.surface(), Sage_Ambient_Space)
-            varV = _from_macaulay2_to_sage(X.ambientFivefold(), Sage_Ambient_Space)
+        # one query for the type of X: 2 for special fourfolds, 1 for other embedded projective varieties
+        t = X.sageTypeCode().sage()
+        if t == 2:
+            # the three varieties are obtained with one query (the Macaulay2 session cannot be shared by threads)
+            parts = macaulay2('X -> {projectiveVariety ring X, surface X, ambientFivefold X}')(X)
+            varX = _from_macaulay2_to_sage(parts[0], Sage_Ambient_Space)
+            varS = _from_macaulay2_to_sage(parts[1], Sage_Ambient_Space)
+            varV = _from_macaulay2_to_sage(parts[2], Sage_Ambient_Space)
             if not hasattr(varS,"_finite_number_of_nodes"):
-                varS._finite_number_of_nodes = X.surface().numberNodes().sage()
-                assert(isinstance(varS._finite_number_of_nodes,(int,Integer)))
+                varS._finite_number_of_nodes = parts[1].numberNodes().sage()
+                if __debug__:
+                    assert(isinstance(varS._finite_number_of_nodes,(int,Integer)))
             X._sage_object = fourfold(varS,varX,varV,check=False)
             X._sage_object._macaulay2_object = X
             return X._sage_object
-        if X.instance('EmbeddedProjectiveVariety').sage():
+        if t == 1:
             polys = X.ideal().sage().gens()
-            s = dict(zip(matrix(polys).base_ring().gens(), Sage_Ambient_Space.coordinate_ring().gens()))
-            polys = [pol.subs(s) for pol in polys]
+            polys = _rename_variables(polys, Sage_Ambient_Space.coordinate_ring())
             X._sage_object = Embedded_projective_variety(Sage_Ambient_Space, polys)
             X._sage_object._macaulay2_object = X
             return X._sage_object
@@ -3666,42 +4319,38 @@ def _from_macaulay2map_to_sagemap(f, Sage_Source=None, Sage_Target=None):
         return f._sage_object
     except AttributeError:
         if Sage_Source is None:
-            Sage_Source = _from_macaulay2_to_sage(f.source(), ProjectiveSpace(f.source().ambient().ring().sage()))
+            Sage_Source = _from_macaulay2_to_sage(f.source(), _projective_space_of_macaulay2_ring(f.source().ambient().ring()))
         if Sage_Target is None:
-            Sage_Target = _from_macaulay2_to_sage(f.target(), ProjectiveSpace(f.target().ambient().ring().sage()))
-        if (macaulay2('SpecialFanoFourfolds.Options.Version >= "2.7.1"')).sage():
-            polys = f.entries().flatten().sage()
-        else:
-            polys = f.matrix().entries().flatten().sage()
-        s = dict(zip(matrix(polys).base_ring().gens(), Sage_Source.ambient().coordinate_ring().gens()))
-        polys = [pol.subs(s) for pol in polys]
+            Sage_Target = _from_macaulay2_to_sage(f.target(), _projective_space_of_macaulay2_ring(f.target().ambient().ring()))
+        # one query for the forms defining f, for the cached values of "isDominant", "isBirational" and "image", and for
+        # the representatives of the map ("maps" of the underlying rational map); in the flags -1 means null, 1 means true
+        entries = 'flatten entries %s' if _macaulay2_version_ok() else 'flatten entries matrix %s'
+        (polys, flags) = macaulay2(('{' + entries + ', apply({%s#"isDominant", %s#"isBirational", %s#"image", try (toRationalMap %s)#"maps" else null}, b -> if b === null then -1 else if b === true then 1 else 0)}') % ((f.name(),)*5)).sage()
+        polys = _rename_variables(polys, Sage_Source.ambient().coordinate_ring())
         f._sage_object = Rational_map_between_embedded_projective_varieties(Sage_Source,Sage_Target,polys)
         f._sage_object._macaulay2_object = f
-        if not f.sharp('"isDominant"')._operator('===',macaulay2('null')).sage():
-            f._sage_object._is_dominant = f.sharp('"isDominant"').sage()
-            assert(isinstance(f._sage_object._is_dominant,bool))
-        if not f.sharp('"isBirational"')._operator('===',macaulay2('null')).sage():
-            f._sage_object._is_birational = f.sharp('"isBirational"').sage()
-            assert(isinstance(f._sage_object._is_birational,bool))
-        if f._sage_object._is_dominant is not True and (not hasattr(f._sage_object,"_closure_of_image")) and (not f.sharp('"image"')._operator('===',macaulay2('null')).sage()):
+        if flags[0] != -1:
+            f._sage_object._is_dominant = flags[0] == 1
+        if flags[1] != -1:
+            f._sage_object._is_birational = flags[1] == 1
+        if f._sage_object._is_dominant is not True and (not hasattr(f._sage_object,"_closure_of_image")) and flags[2] != -1:
             Z = _from_macaulay2_to_sage(f.image(), Sage_Target.ambient_space())
-            assert(Z.is_subset(f._sage_object.target()))
+            if __VALIDATE__:
+                assert(Z.is_subset(f._sage_object.target()))
             f._sage_object._closure_of_image = Z
-        if f._sage_object._is_morphism is not True and (not hasattr(f._sage_object,"_list_of_representatives_of_map")) and (not f.toRationalMap().sharp('"maps"')._operator('===',macaulay2('null')).sage()):
-            assert(macaulay2(f._sage_object) is f)
+        if f._sage_object._is_morphism is not True and (not hasattr(f._sage_object,"_list_of_representatives_of_map")) and flags[3] != -1:
+            if __debug__:
+                assert(macaulay2(f._sage_object) is f)
             f._sage_object._representatives(verbose=False,algorithm='macaulay2')
-            assert(hasattr(f._sage_object,"_list_of_representatives_of_map"))
+            if __debug__:
+                assert(hasattr(f._sage_object,"_list_of_representatives_of_map"))
         return f._sage_object
 
 def _print_partial_M2_output(m2_str):
     w = str(macaulay2.eval(m2_str))
     lineNumber = int(str(macaulay2.eval('lineNumber')))-1
     lineNumber = str(macaulay2.eval('concatenate(interpreterDepth:"o") | toString(' + str(lineNumber) + ')'))
-    i = w.find(lineNumber)
-    if i != -1:
-        w = w[:i]
-    while w[-1] == "\n":
-        w = w[:len(w)-1]
+    w = w.partition(lineNumber)[0].rstrip("\n")
     print(w)
 
 def update_macaulay2_packages():
@@ -3717,18 +4366,33 @@ def update_macaulay2_packages():
         print('## Update not executed. ##')
         return
     print('Downloading files in ' + os.getcwd() + '...')
-    s1 = "curl -s -o Cremona.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/Cremona.m2 && mkdir -p Cremona && curl -s -o Cremona/tests.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/Cremona/tests.m2 && curl -s -o Cremona/documentation.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/Cremona/documentation.m2 && curl -s -o Cremona/examples.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/Cremona/examples.m2 &&curl -s -o MultiprojectiveVarieties.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/MultiprojectiveVarieties.m2 && curl -s -o SpecialFanoFourfolds.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/SpecialFanoFourfolds.m2"
-    os.system(s1)
-    s2 = "curl -s -o Resultants.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/Resultants.m2 && curl -s -o SparseResultants.m2 https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/SparseResultants.m2"
-    os.system(s2)
-    s3 = "curl -s -o PrebuiltExamplesOfRationalFourfolds.m2 https://raw.githubusercontent.com/giovannistagliano/PrebuiltExamplesOfRationalFourfolds/main/PrebuiltExamplesOfRationalFourfolds.m2"
-    os.system(s3)
-    if os.path.isfile('Cremona.m2') and os.path.isdir('Cremona') and os.path.isfile('Cremona/tests.m2') and os.path.isfile('Cremona/documentation.m2') and os.path.isfile('Cremona/examples.m2') and os.path.isfile('MultiprojectiveVarieties.m2') and os.path.isfile('SpecialFanoFourfolds.m2') and os.path.isfile('Resultants.m2') and os.path.isfile('SparseResultants.m2') and os.path.isfile('PrebuiltExamplesOfRationalFourfolds.m2'):
-        print('Download successfully completed.')
-    else:
-        raise FileNotFoundError("something went wrong")
+    M2_packages = "https://raw.githubusercontent.com/Macaulay2/M2/development/M2/Macaulay2/packages/"
+    files = [(f, M2_packages + f) for f in ['Cremona.m2', 'Cremona/tests.m2', 'Cremona/documentation.m2', 'Cremona/examples.m2', 'MultiprojectiveVarieties.m2', 'SpecialFanoFourfolds.m2', 'Resultants.m2', 'SparseResultants.m2']]
+    files.append(('PrebuiltExamplesOfRationalFourfolds.m2', "https://raw.githubusercontent.com/giovannistagliano/PrebuiltExamplesOfRationalFourfolds/main/PrebuiltExamplesOfRationalFourfolds.m2"))
+    os.makedirs('Cremona', exist_ok=True)
+    # the downloads are independent, so they are done concurrently; the exception raised by each download is collected,
+    # since older copies of the files may already be in the directory and their presence does not prove success
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.request import urlretrieve
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        futures = [(f, executor.submit(urlretrieve, url, f)) for (f, url) in files]
+    failed = [(f, fut.exception()) for (f, fut) in futures if fut.exception() is not None]
+    if len(failed) > 0:
+        for (f, e) in failed:
+            print('Failed to download ' + f + ': ' + str(e))
+        raise FileNotFoundError("something went wrong, the following files were not downloaded: " + ", ".join([f for (f, e) in failed]))
+    print('Download successfully completed.')
     print('## You should restart Sage and reload this module.')
 
+_M2_VERSION_OK = None
+
+def _macaulay2_version_ok():
+    r"""Return ``True`` if the version of the ``Macaulay2`` package ``SpecialFanoFourfolds`` is at least 2.7.1 (computed once)."""
+    global _M2_VERSION_OK
+    if _M2_VERSION_OK is None:
+        _M2_VERSION_OK = bool(macaulay2('SpecialFanoFourfolds.Options.Version >= "2.7.1"').sage())
+    return _M2_VERSION_OK
+
 def _set_macaulay2_():
     r"""Setting of ``Macaulay2``."""
     if not (Macaulay2().is_present()): # and macaulay2.version() >= (1, 21)):
@@ -3736,7 +4400,7 @@ def _set_macaulay2_():
             print("Please, install Macaulay2 version 1.21 or newer to use the module sff.py")
         return
     macaulay2('needsPackage "SpecialFanoFourfolds"')
-    if __name__ == "__main__" and not (macaulay2('SpecialFanoFourfolds.Options.Version >= "2.7.1"')).sage():
+    if __name__ == "__main__" and not _macaulay2_version_ok():
         print(r"""Your version of some Macaulay2 package is outdated. Please, execute the command:
 
 update_macaulay2_packages()
@@ -3751,19 +4415,18 @@ Alternatively, you may execute the following command in a Unix/Linux shell: curl
     macaulay2('importFrom_Cremona {"maps"}')
     # I got problems switching from M2 to sage objects due to underscores in the variables.
     # This interim M2 code solves the problem.
-    macaulay2.eval(r"""
+    code = r"""
+sageTypeCode = x -> if instance(x,HodgeSpecialFourfold) then 2 else if instance(x,EmbeddedProjectiveVariety) then 1 else 0;
 removeUnderscores = method()
 removeUnderscores (Ring, ZZ) := memoize((K, n) -> (
     assert(isField K);
     if n>30 then return K[vars(52..52+n)];
-    (x0,x1,x2,x3,x4,x5,x6,x7,x8,x9,x10) := (local x0,local x1,local x2,local x3,local x4,local x5,local x6,local x7,local x8,local x9,local x10);
-    (x11,x12,x13,x14,x15,x16,x17,x18,x19,x20) := (local x11,local x12,local x13,local x14,local x15,local x16,local x17,local x18,local x19,local x20);
-    (x21,x22,x23,x24,x25,x26,x27,x28,x29,x30) := (local x21,local x22,local x23,local x24,local x25,local x26,local x27,local x28,local x29,local x30);
-    K[take((x0,x1,x2,x3,x4,x5,x6,x7,x8,x9,x10)|(x11,x12,x13,x14,x15,x16,x17,x18,x19,x20)|(x21,x22,x23,x24,x25,x26,x27,x28,x29,x30),n+1)]
+    K[apply(n+1, i -> getSymbol("x" | toString i))]
 ));
 removeUnderscores EmbeddedProjectiveVariety := X -> (
     if X.cache#?"removeUnderscores" then return X.cache#"removeUnderscores";
     P := removeUnderscores(coefficientRing X,dim ambient X);
+    if ambient X === projectiveVariety P then return (X.cache#"removeUnderscores" = X);
     Y := projectiveVariety(sub(ideal X,vars P),Saturate=>false);
     if codim Y > 0 then assert(ambient Y === projectiveVariety P) else assert(ambient Y == projectiveVariety P);
     if X.cache#?"euler" then Y.cache#"euler" = X.cache#"euler";
@@ -3831,7 +4494,15 @@ removeUnderscores HodgeSpecialFourfold := X -> (
     Y.cache#("removeUnderscores",surface Y, ambientFivefold Y) = Y;
     X.cache#("removeUnderscores",surface X, ambientFivefold X) = Y
 );
-""")
+"""
+    # If the module is loaded again in the same Macaulay2 session, the interim code is not sent again when it is unchanged,
+    # which also keeps the memoized rings of removeUnderscores; the code is tagged with its own hash, so that any change
+    # to it (e.g. new helpers such as sageTypeCode) is sent to a session in which an older version was defined.
+    import hashlib
+    tag = hashlib.sha1(code.encode()).hexdigest()
+    if macaulay2('sffInterimCodeTag === "' + tag + '"').sage():
+        return
+    macaulay2.eval(code + 'sffInterimCodeTag = "' + tag + '";\n')
 
 _set_macaulay2_()
 